@@ -0,0 +1,139 @@
+"""Concurrent read/write throughput of default and tuned SQLite engines
+
+Readers run news plan queries while writers save and deliver outbox
+messages, like the news tick does.
+
+Usage:
+    python benchmarks/db_concurrency.py [--readers 8] [--writers 2] [--seconds 5]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker, scoped_session
+
+TMP_DIR = tempfile.mkdtemp()
+# Do not touch working database on import
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'import.sqlite')}"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "redditbot"))
+
+from db.base import create_engine, metadata  # noqa: E402
+from db.schema import User, Subreddit, Subscription, OutboxMessage  # noqa: E402
+
+USERS = 2000
+SUBREDDITS = 200
+SUBSCRIPTIONS_PER_USER = 10
+NOW = datetime(2020, 1, 1)
+
+
+def fill(engine):
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            User.__table__.insert(),
+            [{"id": i, "first_name": f"user{i}",
+              "next_delivery_utc": NOW + timedelta(minutes=i % 24 * 60)}
+             for i in range(USERS)],
+        )
+        conn.execute(
+            Subreddit.__table__.insert(),
+            [{"id": i, "title": f"subreddit{i}"} for i in range(SUBREDDITS)],
+        )
+        conn.execute(
+            Subscription.__table__.insert(),
+            [{"user_id": user_id, "subreddit_id": (user_id + i * 7) % SUBREDDITS}
+             for user_id in range(USERS) for i in range(SUBSCRIPTIONS_PER_USER)],
+        )
+
+
+def run(engine, readers, writers, seconds):
+    session_factory = scoped_session(sessionmaker(bind=engine))
+    stop = threading.Event()
+    counters = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def count(name):
+        with lock:
+            counters[name] += 1
+
+    def reader(idx):
+        sess = session_factory()
+        offset = 0
+        while not stop.is_set():
+            try:
+                sess.query(Subreddit.title, User.id).join(
+                    Subscription, Subscription.subreddit_id == Subreddit.id
+                ).join(User, User.id == Subscription.user_id).filter(
+                    User.next_delivery_utc.between(
+                        NOW + timedelta(minutes=offset % 24 * 60 - 1),
+                        NOW + timedelta(minutes=offset % 24 * 60),
+                    )
+                ).all()
+                sess.commit()
+                count("reads")
+            except sa.exc.OperationalError:
+                sess.rollback()
+                count("errors")
+            offset += 1
+        session_factory.remove()
+
+    def writer(idx):
+        sess = session_factory()
+        num = 0
+        while not stop.is_set():
+            try:
+                message = OutboxMessage(f"{idx}:{num}", num % USERS, "text")
+                sess.add(message)
+                sess.commit()
+                message.delivered_at = sa.func.now()
+                sess.commit()
+                count("writes")
+            except sa.exc.OperationalError:
+                sess.rollback()
+                count("errors")
+            num += 1
+        session_factory.remove()
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    engines = {
+        "default": lambda url: sa.create_engine(url),
+        "tuned": create_engine,
+    }
+    print(f"{args.readers} readers, {args.writers} writers, {args.seconds}s")
+    for name, make_engine in engines.items():
+        url = f"sqlite:///{os.path.join(TMP_DIR, name + '.sqlite')}"
+        engine = make_engine(url)
+        fill(engine)
+        result = run(engine, args.readers, args.writers, args.seconds)
+        print(
+            f"{name:>8}: {result['reads'] / args.seconds:8.1f} reads/s "
+            f"{result['writes'] / args.seconds:8.1f} writes/s "
+            f"{result['errors']} errors"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Concurrent /get latency of threads and asyncio execution modes
+
+Fake reddit server answers with fixed delay, so the benchmark shows
+how many /get commands each mode serves concurrently while waiting
+for network, not reddit or telegram speed. Requires aiohttp.
+
+Usage:
+    python benchmarks/get_load.py [--requests 200] [--subreddits 5] [--delay 0.1]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TMP_DIR = tempfile.mkdtemp()
+# Do not touch working database on import
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'bench.sqlite')}"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "redditbot"))
+
+import db  # noqa: E402
+from db.base import engine, metadata  # noqa: E402
+from db.schema import User, Subreddit, Subscription  # noqa: E402
+from reddit import Reddit, AsyncReddit  # noqa: E402
+from bot import MessageRenderer  # noqa: E402
+from bot.aio import AsyncRunner  # noqa: E402
+from bot.handlers import get_handler, get_handler_async  # noqa: E402
+
+USERS = 100
+LISTING = {
+    "data": {
+        "children": [
+            {
+                "kind": "t3",
+                "data": {
+                    "title": f"Post {i}",
+                    "url": f"https://example.com/{i}",
+                    "score": 100 - i,
+                }
+            }
+            for i in range(5)
+        ]
+    }
+}
+
+
+def start_server(delay):
+    body = json.dumps(LISTING).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def fill(subreddits):
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            User.__table__.insert(),
+            [{"id": i, "first_name": f"user{i}"} for i in range(USERS)],
+        )
+        conn.execute(
+            Subreddit.__table__.insert(),
+            [{"id": i, "title": f"subreddit{i}"} for i in range(USERS * subreddits)],
+        )
+        conn.execute(
+            Subscription.__table__.insert(),
+            [{"user_id": i, "subreddit_id": i * subreddits + j}
+             for i in range(USERS) for j in range(subreddits)],
+        )
+
+
+def make_update(user_id, replies):
+    message = SimpleNamespace(reply_html=lambda text, **kwargs: replies.append(text))
+    return SimpleNamespace(
+        effective_user=SimpleNamespace(id=user_id, first_name=f"user{user_id}"),
+        effective_message=message,
+    )
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def run(bot, requests, submit):
+    """Send all /get commands at once and wait for replies
+
+    Args:
+        bot (SimpleNamespace): Fake bot with clients
+        requests (int): Commands count
+        submit (Callable): Schedules handler call, returns future
+
+    Returns:
+        Tuple[float, List[float], int]: Total seconds, latencies and replies count
+    """
+    replies = []
+    latencies = []
+
+    def timed(started):
+        return lambda _: latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    futures = []
+    for num in range(requests):
+        update = make_update(num % USERS, replies)
+        context = SimpleNamespace(bot=bot, args=[])
+        future = submit(update, context)
+        future.add_done_callback(timed(time.perf_counter()))
+        futures.append(future)
+    wait(futures)
+    for future in futures:
+        future.result()
+    return time.perf_counter() - started, latencies, len(replies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--subreddits", type=int, default=5)
+    parser.add_argument("--delay", type=float, default=0.1)
+    parser.add_argument(
+        "--workers", type=int, default=4, help="dispatcher workers in threads mode"
+    )
+    parser.add_argument("--pool-size", type=int, default=10)
+    args = parser.parse_args()
+
+    server = start_server(args.delay)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/r/"
+    fill(args.subreddits)
+
+    clients = {
+        "reddit": Reddit(
+            cache=False, pool_size=args.pool_size, rate_limit=1e6, rate_burst=10 ** 6
+        ),
+        "aio_reddit": AsyncReddit(
+            cache=False, pool_size=args.pool_size, rate_limit=1e6, rate_burst=10 ** 6
+        ),
+    }
+    for client in clients.values():
+        client._BASE_URL = base_url
+
+    aio = AsyncRunner()
+    aio.add_cleanup(clients["aio_reddit"].close)
+    aio.start()
+    bot = SimpleNamespace(
+        db=db, aio=aio, renderer=MessageRenderer(), news_digest=False, **clients
+    )
+
+    workers = ThreadPoolExecutor(max_workers=args.workers)
+    modes = {
+        "threads": lambda update, context: workers.submit(
+            get_handler.__wrapped__, update, context
+        ),
+        "asyncio": lambda update, context: aio.submit(
+            get_handler_async.__wrapped__(update, context)
+        ),
+    }
+    print(
+        f"{args.requests} /get, {args.subreddits} subreddits each, "
+        f"{args.delay}s reddit delay, {args.workers} workers, "
+        f"{args.pool_size} connections"
+    )
+    for name, submit in modes.items():
+        total, latencies, replies = run(bot, args.requests, submit)
+        print(
+            f"{name:>8}: {args.requests / total:8.1f} /get/s "
+            f"p50 {percentile(latencies, 50) * 1000:7.0f}ms "
+            f"p95 {percentile(latencies, 95) * 1000:7.0f}ms "
+            f"{replies} replies"
+        )
+
+    workers.shutdown()
+    aio.stop()
+    clients["reddit"].close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
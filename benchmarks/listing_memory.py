@@ -0,0 +1,192 @@
+"""Memory of cached listings as raw reddit json and as parsed models
+
+Generates listings shaped like reddit `top.json` responses, keeps
+them parsed as json dicts and as `reddit.Listing` models and reports
+traced memory and parse time of both.
+
+Usage:
+    python benchmarks/listing_memory.py [--listings 5000] [--posts 5]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+TMP_DIR = tempfile.mkdtemp()
+# Do not touch working database on import
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'import.sqlite')}"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "redditbot"))
+
+from reddit import Listing  # noqa: E402
+from reddit.models import loads, orjson  # noqa: E402
+
+
+def make_post(subreddit, num):
+    post_id = f"{subreddit}{num}"
+    preview_url = f"https://preview.redd.it/{post_id}.jpg"
+    data = {
+        "subreddit": subreddit,
+        "subreddit_id": f"t5_{subreddit}",
+        "subreddit_name_prefixed": f"r/{subreddit}",
+        "subreddit_type": "public",
+        "subreddit_subscribers": random.randint(1000, 10 ** 7),
+        "id": post_id,
+        "name": f"t3_{post_id}",
+        "title": f"Post {num} of {subreddit} " * random.randint(2, 8),
+        "url": f"https://i.redd.it/{post_id}.jpg",
+        "permalink": f"/r/{subreddit}/comments/{post_id}/post_{num}/",
+        "domain": "i.redd.it",
+        "author": f"author{num}",
+        "author_fullname": f"t2_author{num}",
+        "author_flair_text": None,
+        "author_flair_richtext": [],
+        "selftext": "Text " * random.randint(0, 100),
+        "selftext_html": None,
+        "thumbnail": f"https://b.thumbs.redditmedia.com/{post_id}.jpg",
+        "thumbnail_height": 140,
+        "thumbnail_width": 140,
+        "link_flair_text": "Flair",
+        "link_flair_richtext": [{"e": "text", "t": "Flair"}],
+        "link_flair_css_class": None,
+        "link_flair_text_color": "dark",
+        "score": random.randint(0, 10 ** 5),
+        "ups": random.randint(0, 10 ** 5),
+        "downs": 0,
+        "upvote_ratio": random.random(),
+        "num_comments": random.randint(0, 10 ** 4),
+        "num_crossposts": random.randint(0, 100),
+        "total_awards_received": random.randint(0, 10),
+        "gilded": 0,
+        "created": time.time(),
+        "created_utc": time.time(),
+        "edited": False,
+        "over_18": False,
+        "spoiler": False,
+        "locked": False,
+        "stickied": False,
+        "archived": False,
+        "is_self": False,
+        "is_video": False,
+        "is_original_content": False,
+        "is_reddit_media_domain": True,
+        "hide_score": False,
+        "quarantine": False,
+        "saved": False,
+        "clicked": False,
+        "visited": False,
+        "hidden": False,
+        "post_hint": "image",
+        "whitelist_status": "all_ads",
+        "pwls": 6,
+        "wls": 6,
+        "media": None,
+        "media_embed": {},
+        "secure_media": None,
+        "secure_media_embed": {},
+        "gildings": {"gid_1": 1},
+        "all_awardings": [
+            {
+                "id": f"award_{award}",
+                "name": f"Award {award}",
+                "description": "Shows the award",
+                "coin_price": 100,
+                "count": 1,
+                "icon_url": f"https://www.redditstatic.com/awards/{award}.png",
+            }
+            for award in range(random.randint(0, 3))
+        ],
+        "preview": {
+            "enabled": True,
+            "images": [
+                {
+                    "id": f"image_{post_id}",
+                    "source": {
+                        "url": preview_url,
+                        "width": 1080,
+                        "height": 1350,
+                    },
+                    "resolutions": [
+                        {
+                            "url": f"{preview_url}?width={width}",
+                            "width": width,
+                            "height": width * 5 // 4,
+                        }
+                        for width in (108, 216, 320, 640, 960, 1080)
+                    ],
+                    "variants": {},
+                }
+            ],
+        },
+    }
+    return {"kind": "t3", "data": data}
+
+
+def make_listing(subreddit, posts):
+    children = [make_post(subreddit, num) for num in range(posts)]
+    return {
+        "kind": "Listing",
+        "data": {
+            "modhash": "",
+            "dist": len(children),
+            "children": children,
+            "after": children[-1]["data"]["name"] if children else None,
+            "before": None,
+        },
+    }
+
+
+def measure(bodies, parse):
+    """Parse response bodies and keep results
+
+    Args:
+        bodies (List[bytes]): Response bodies
+        parse (Callable[[bytes], Any]): Body parser
+
+    Returns:
+        Tuple[int, float]: Traced bytes of kept results and parse seconds
+    """
+    tracemalloc.start()
+    started = time.perf_counter()
+    kept = [parse(body) for body in bodies]
+    elapsed = time.perf_counter() - started
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=5000)
+    parser.add_argument("--posts", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(0)
+    bodies = [
+        json.dumps(make_listing(f"subreddit{num}", args.posts)).encode()
+        for num in range(args.listings)
+    ]
+    print(
+        f"{args.listings} listings, {args.posts} posts each, "
+        f"{sum(map(len, bodies)) / len(bodies) / 1024:.1f}KiB average response, "
+        f"orjson: {orjson is not None}"
+    )
+    modes = {
+        "raw json": json.loads,
+        "listing": lambda body: Listing.from_json(loads(body)),
+    }
+    for name, parse in modes.items():
+        size, elapsed = measure(bodies, parse)
+        print(
+            f"{name:>8}: {size / 2 ** 20:8.1f}MiB "
+            f"{size / args.listings / 1024:7.2f}KiB per listing "
+            f"{args.listings / elapsed:9.0f} listings/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
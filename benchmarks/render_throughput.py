@@ -0,0 +1,106 @@
+"""News rendering throughput with different renderer process pools
+
+Renders news of many users with personal digest template, like the
+news job does for a large delivery, and reports messages per second
+and per used core.
+
+Usage:
+    python benchmarks/render_throughput.py [--users 20000] [--processes 0 1 2 4]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from collections import namedtuple
+
+TMP_DIR = tempfile.mkdtemp()
+# Do not touch working database on import
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'import.sqlite')}"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "redditbot"))
+
+from bot import MessageRenderer  # noqa: E402
+from reddit import Listing  # noqa: E402
+
+SUBREDDITS = 500
+TEMPLATE = "Hi, $first_name! Subreddit: $link\n$posts"
+UserNames = namedtuple("UserNames", ["id", "first_name", "last_name"])
+
+
+def make_listing(subreddit):
+    return Listing.from_json(
+        {
+            "data": {
+                "children": [
+                    {
+                        "kind": "t3",
+                        "data": {
+                            "name": f"t3_{subreddit}{i}",
+                            "title": f"Post {i} of {subreddit} & <friends> " * 3,
+                            "url": f"https://example.com/{subreddit}/{i}?a=1&b=2",
+                            "score": 1000 - i,
+                        }
+                    }
+                    for i in range(5)
+                ]
+            }
+        }
+    )
+
+
+def make_news(users, subscriptions):
+    random.seed(0)
+    return [
+        (
+            "news:202001010800",
+            chat_id,
+            UserNames(chat_id, f"user <{chat_id}>", None),
+            [f"subreddit{i}" for i in random.sample(range(SUBREDDITS), subscriptions)],
+        )
+        for chat_id in range(users)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--subscriptions", type=int, default=10)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--processes", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--no-digest", dest="digest", action="store_false")
+    args = parser.parse_args()
+
+    news = make_news(args.users, args.subscriptions)
+    print(
+        f"{args.users} users, {args.subscriptions} subreddits each, "
+        f"digest: {args.digest}, {os.cpu_count()} cpus"
+    )
+    for processes in args.processes:
+        renderer = MessageRenderer(
+            TEMPLATE, processes=processes, chunk_size=args.chunk_size
+        )
+        rendered = {
+            f"subreddit{i}": renderer.render_posts(
+                f"subreddit{i}", make_listing(f"subreddit{i}")
+            )
+            for i in range(SUBREDDITS)
+        }
+        # Start processes before measure
+        renderer.render_news(news[: args.chunk_size * 2], rendered, args.digest)
+
+        started = time.perf_counter()
+        messages = renderer.render_news(news, rendered, args.digest)
+        elapsed = time.perf_counter() - started
+        renderer.close()
+
+        cores = max(processes, 1)
+        print(
+            f"{processes:>2} processes: {len(messages) / elapsed:9.0f} messages/s "
+            f"{len(messages) / elapsed / cores:9.0f} per core "
+            f"{len(messages)} messages"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Per-update latency of webhook mode
+
+Posts recorded updates to local webhook server and measures time from
+request to dispatcher handler call. Repeated update ids are posted
+too, they must be answered but not handled twice.
+
+Recorded updates file has one telegram update json per line, e.g. `result`
+items of getUpdates response. Without file `/get` commands are generated.
+
+Usage:
+    python benchmarks/webhook_latency.py [--updates updates.jsonl] [--count 500]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+TMP_DIR = tempfile.mkdtemp()
+# Do not touch working database on import
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'import.sqlite')}"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "redditbot"))
+
+from telegram import Bot, Update, User  # noqa: E402
+from telegram.ext import TypeHandler  # noqa: E402
+from bot.webhook import WebhookUpdater, SECRET_TOKEN_HEADER  # noqa: E402
+
+SECRET_TOKEN = "benchmark-secret"
+URL_PATH = "/telegram"
+
+
+class OfflineBot(Bot):
+    """Bot answering startup requests without telegram api"""
+
+    def get_me(self, *args, **kwargs):
+        self.bot = User(123456, "benchmark", is_bot=True, username="benchmark_bot")
+        return self.bot
+
+    def get_my_commands(self, *args, **kwargs):
+        self._commands = []
+        return self._commands
+
+
+def generate_updates(count):
+    for update_id in range(1, count + 1):
+        yield {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": update_id % 100, "type": "private"},
+                "from": {"id": update_id % 100, "is_bot": False, "first_name": "user"},
+                "text": "/get",
+                "entities": [{"type": "bot_command", "offset": 0, "length": 4}],
+            },
+        }
+
+
+def load_updates(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def post(url, update, secret_token):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(update).encode(),
+        headers={"Content-Type": "application/json", SECRET_TOKEN_HEADER: secret_token},
+    )
+    with urllib.request.urlopen(request) as response:
+        return response.status
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", help="recorded updates jsonl file")
+    parser.add_argument("--count", type=int, default=500)
+    parser.add_argument("--duplicates", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.updates:
+        updates = load_updates(args.updates)
+    else:
+        updates = list(generate_updates(args.count))
+    duplicates = updates[: int(len(updates) * args.duplicates)]
+
+    sent_at = {}
+    handled_at = {}
+    handled = threading.Event()
+
+    def record(update, context):
+        handled_at.setdefault(update.update_id, []).append(time.perf_counter())
+        if len(handled_at) == len(updates):
+            handled.set()
+
+    updater = WebhookUpdater(bot=OfflineBot("123456:benchmark"), use_context=True)
+    updater.dispatcher.add_handler(TypeHandler(Update, record))
+    port = free_port()
+    updater.start_webhook(
+        listen="127.0.0.1", port=port, url_path=URL_PATH, secret_token=SECRET_TOKEN
+    )
+    url = f"http://127.0.0.1:{port}{URL_PATH}"
+    time.sleep(0.5)
+
+    def send(update):
+        started = time.perf_counter()
+        sent_at.setdefault(update["update_id"], started)
+        post(url, update, SECRET_TOKEN)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        responses = list(executor.map(send, updates + duplicates))
+    handled.wait(30)
+    total = time.perf_counter() - started
+
+    try:
+        post(url, updates[0], "bad-secret")
+        rejected = False
+    except urllib.error.HTTPError as err:
+        rejected = err.code == 403
+    updater.stop()
+
+    latencies = [
+        handled_at[update_id][0] - sent_at[update_id] for update_id in handled_at
+    ]
+    repeated = sum(len(times) - 1 for times in handled_at.values())
+    print(
+        f"{len(updates)} updates, {len(duplicates)} duplicates, "
+        f"{args.concurrency} concurrent requests"
+    )
+    print(
+        f"   total: {len(updates) / total:8.1f} updates/s "
+        f"{len(handled_at)} handled, {repeated} handled twice, "
+        f"bad secret rejected: {rejected}"
+    )
+    print(
+        f"response: p50 {percentile(responses, 50) * 1000:6.1f}ms "
+        f"p95 {percentile(responses, 95) * 1000:6.1f}ms"
+    )
+    print(
+        f" handler: p50 {percentile(latencies, 50) * 1000:6.1f}ms "
+        f"p95 {percentile(latencies, 95) * 1000:6.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,22 @@
 import os
+import socket
 import logging
 from datetime import datetime, time
+from urllib.parse import urlparse
 
 from telegram.utils.request import Request
-from telegram.ext.messagequeue import MessageQueue
-from telegram.ext import Updater, Filters
+from telegram.ext import Filters
 from telegram.ext import CommandHandler, MessageHandler
 
 import db
 import tasks
 from log import init_logger
-from reddit import Reddit
+from reddit import Reddit, AsyncReddit, ListingCache
 from googleapi.timezone import TimeZoneAPI
-from bot import MQBot, handlers
+from timezones import TimeZoneResolver, OfflineTimeZoneFinder
+from bot import MQBot, SendScheduler, MessageRenderer, NEWS_TEMPLATE, handlers
+from bot.aio import AsyncRunner
+from bot.webhook import WebhookUpdater
 
 
 if __name__ == "__main__":
@@ -24,6 +28,12 @@ if __name__ == "__main__":
     if token is None:
         raise RuntimeError("Set environ variable TELEGRAM_TOKEN")
 
+    # Only one bot process receives updates, workers deliver news
+    app_role = os.environ.get("APP_ROLE", "bot").lower()
+    if app_role not in ("bot", "worker"):
+        raise RuntimeError("APP_ROLE must be one of: bot, worker")
+    worker_id = os.environ.get("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
     request_kwargs = {"con_pool_size": 8, "connect_timeout": 10, "read_timeout": 3}
     proxy = os.environ.get("TELEGRAM_PROXY")
     if proxy:
@@ -35,36 +45,109 @@ if __name__ == "__main__":
     bot = MQBot(
         token,
         request=Request(**request_kwargs),
-        mqueue=MessageQueue(all_burst_limit=29, all_time_limit_ms=1017),
+        scheduler=SendScheduler(all_burst_limit=29, all_time_limit_ms=1017),
+        worker_id=worker_id[:64],
+        lease_seconds=int(os.environ.get("WORKER_LEASE_SECONDS", 600)),
+        # One process sends all messages within bot wide telegram limits
+        send_outbox=app_role == "bot",
     )
 
     bot.db = db
-    bot.reddit = Reddit()
+    bot.reddit = Reddit(
+        cache=ListingCache(
+            ttl=int(os.environ.get("REDDIT_CACHE_TTL", 600)),
+            maxsize=int(os.environ.get("REDDIT_CACHE_SIZE", 1024)),
+        ),
+        pool_size=int(os.environ.get("REDDIT_POOL_SIZE", 10)),
+        connect_timeout=float(os.environ.get("REDDIT_CONNECT_TIMEOUT", 3.05)),
+        read_timeout=float(os.environ.get("REDDIT_READ_TIMEOUT", 10)),
+        retries=int(os.environ.get("REDDIT_RETRIES", 3)),
+        rate_limit=float(os.environ.get("REDDIT_RATE_LIMIT", 2)),
+        rate_burst=int(os.environ.get("REDDIT_RATE_BURST", 5)),
+    )
+    bot.renderer = MessageRenderer(
+        os.environ.get("NEWS_TEMPLATE", NEWS_TEMPLATE),
+        processes=int(os.environ.get("RENDER_PROCESSES", 0)),
+        chunk_size=int(os.environ.get("RENDER_CHUNK_SIZE", 500)),
+    )
     bot.admin = int(os.environ.get("TELEGRAM_ADMIN_ID", 0))
     bot.tz_api = None
     google_api_key = os.environ.get("GOOGLE_API_KEY")
     if google_api_key:
-        bot.tz_api = TimeZoneAPI(google_api_key)
+        bot.tz_api = TimeZoneAPI(
+            google_api_key, timeout=float(os.environ.get("GOOGLE_API_TIMEOUT", 5))
+        )
+    tz_offline = None
+    if OfflineTimeZoneFinder.is_available():
+        tz_offline = OfflineTimeZoneFinder()
+    else:
+        logger.warning("timezonefinder is not installed, offline timezones disabled")
+    tz_prefer_api = os.environ.get("TIMEZONE_PREFER_API", "").lower() in ("1", "true", "yes")
+    bot.timezones = TimeZoneResolver(
+        db, offline=tz_offline, api=bot.tz_api, prefer_api=tz_prefer_api
+    )
 
     bot.news_time = time(hour=8, minute=00)
     bot.news_time = bot.news_time .hour * 60 + bot.news_time .minute  # get minutes
+    bot.news_digest = os.environ.get("NEWS_DIGEST", "").lower() in ("1", "true", "yes")
+    bot.prefetch_minutes = int(os.environ.get("NEWS_PREFETCH_MINUTES", 5))
+    bot.backup_full_days = int(os.environ.get("BACKUP_FULL_DAYS", 7))
+    bot.delivery_batch = int(os.environ.get("WORKER_BATCH_SIZE", 500))
+
+    execution_mode = os.environ.get("EXECUTION_MODE", "threads").lower()
+    if execution_mode not in ("threads", "asyncio"):
+        raise RuntimeError("EXECUTION_MODE must be one of: threads, asyncio")
+
+    bot.aio = None
+    if execution_mode == "asyncio":
+        bot.aio = AsyncRunner(db_workers=int(os.environ.get("ASYNC_DB_WORKERS", 4)))
+        bot.aio_reddit = AsyncReddit(
+            cache=bot.reddit.cache if bot.reddit.cache is not None else False,
+            limiter=bot.reddit.limiter,
+            pool_size=int(os.environ.get("REDDIT_POOL_SIZE", 10)),
+            connect_timeout=float(os.environ.get("REDDIT_CONNECT_TIMEOUT", 3.05)),
+            read_timeout=float(os.environ.get("REDDIT_READ_TIMEOUT", 10)),
+            retries=int(os.environ.get("REDDIT_RETRIES", 3)),
+        )
+        bot.aio.add_cleanup(bot.aio_reddit.close)
+        if bot.tz_api is not None:
+            bot.aio.add_cleanup(bot.tz_api.close_async)
+        bot.aio.start()
+        logger.info("Run handlers in asyncio event loop")
 
-    updater = Updater(bot=bot, use_context=True)
+    updater = WebhookUpdater(bot=bot, use_context=True)
     dp = updater.dispatcher
     jobs = updater.job_queue
 
     dp.add_handler(CommandHandler("start", handlers.start_handler))
-    dp.add_handler(CommandHandler("r", handlers.r_handler))
-    dp.add_handler(CommandHandler("get", handlers.get_handler))
     dp.add_handler(CommandHandler("timezone", handlers.timezone_handler))
-    dp.add_handler(MessageHandler(Filters.location, handlers.set_timezone))
-
-    jobs.run_repeating(tasks.send_news, 60, 0)
+    dp.add_handler(CommandHandler("schedule", handlers.schedule_handler))
+    if bot.aio is None:
+        dp.add_handler(CommandHandler("r", handlers.r_handler))
+        dp.add_handler(CommandHandler("get", handlers.get_handler))
+        dp.add_handler(MessageHandler(Filters.location, handlers.set_timezone))
+    else:
+        dp.add_handler(CommandHandler("r", handlers.r_handler_async))
+        dp.add_handler(CommandHandler("get", handlers.get_handler_async))
+        dp.add_handler(MessageHandler(Filters.location, handlers.set_timezone_async))
+
+    if app_role == "bot":
+        jobs.run_repeating(tasks.drain_outbox, 10, 0)
+        jobs.run_daily(tasks.cleanup_outbox, time(hour=0, minute=30))
+    # Workers do not get schedule changes from handlers, wake up often
+    news_max_sleep = 3600 if app_role == "bot" else 60
+    bot.news_scheduler = tasks.NewsScheduler(
+        jobs, max_sleep=int(os.environ.get("NEWS_MAX_SLEEP", news_max_sleep))
+    )
+    bot.news_scheduler.wake()
 
     if bot.admin:
         dp.add_handler(
             CommandHandler("log", handlers.admin.log_handler, Filters.chat(bot.admin))
         )
+        dp.add_handler(
+            CommandHandler("stats", handlers.admin.stats_handler, Filters.chat(bot.admin))
+        )
         dp.add_handler(
             CommandHandler("dump", handlers.admin.dump_handler, Filters.chat(bot.admin))
         )
@@ -78,12 +161,35 @@ if __name__ == "__main__":
             )
         )
 
-        jobs.run_daily(tasks.backup_db, time(hour=17, minute=00))
+        if app_role == "bot":
+            jobs.run_daily(tasks.backup_db, time(hour=17, minute=00))
 
     # Start the Bot
-    updater.start_polling()
+    webhook_url = os.environ.get("WEBHOOK_URL")
+    if app_role == "worker":
+        updater.start_worker()
+        logger.info(f"Run news worker {bot.worker_id}")
+    elif webhook_url:
+        updater.start_webhook(
+            listen=os.environ.get("WEBHOOK_LISTEN", "0.0.0.0"),
+            port=int(os.environ.get("WEBHOOK_PORT", 8443)),
+            url_path=os.environ.get("WEBHOOK_PATH", urlparse(webhook_url).path),
+            cert=os.environ.get("WEBHOOK_CERT"),
+            key=os.environ.get("WEBHOOK_KEY"),
+            webhook_url=webhook_url,
+            secret_token=os.environ.get("WEBHOOK_SECRET"),
+            bootstrap_retries=-1,
+        )
+        logger.info(f"Receive updates with webhook: {webhook_url}")
+    else:
+        updater.start_polling()
 
     # Block until the user presses Ctrl-C or the process receives SIGINT,
     # SIGTERM or SIGABRT. This should be used most of the time, since
     # start_polling() is non-blocking and will stop the bot gracefully.
     updater.idle()
+
+    bot.renderer.close()
+
+    if bot.aio is not None:
+        bot.aio.stop()
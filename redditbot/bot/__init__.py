@@ -1,2 +1,3 @@
-from .mq_bot import MQBot
+from .mq_bot import MQBot, SendScheduler
+from .render import MessageRenderer, NEWS_TEMPLATE
 from . import handlers
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRunner:
+    """Event loop thread for asyncio execution mode
+
+    Handlers coroutines run concurrently in one event loop thread
+    instead of occupying dispatcher worker threads while waiting
+    for network. Blocking database calls run in a small executor.
+
+    Args:
+        db_workers (int): Max concurrent blocking database calls
+    """
+
+    def __init__(self, db_workers=4):
+        self.loop = asyncio.new_event_loop()
+        self._executor = ThreadPoolExecutor(
+            max_workers=db_workers, thread_name_prefix="db"
+        )
+        self._thread = threading.Thread(
+            target=self._run_loop, name="asyncio", daemon=True
+        )
+        self._cleanups = []
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def start(self):
+        """Start event loop thread"""
+        self._thread.start()
+
+    def add_cleanup(self, coroutine_function):
+        """Register coroutine function to run on stop, e.g. to close sessions
+
+        Args:
+            coroutine_function (Callable[[], Awaitable]): Cleanup coroutine function
+        """
+        self._cleanups.append(coroutine_function)
+
+    def stop(self, timeout=10):
+        """Run cleanups and stop event loop thread
+
+        Args:
+            timeout (int | float): Max seconds to wait for cleanups
+        """
+        if not self._thread.is_alive():
+            return
+        for cleanup in self._cleanups:
+            try:
+                self.submit(cleanup()).result(timeout)
+            except Exception:
+                logger.exception(f"Cleanup {cleanup} failed")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self._executor.shutdown(wait=False)
+
+    def submit(self, coroutine):
+        """Schedule coroutine in event loop from any thread
+
+        Args:
+            coroutine (Coroutine): Coroutine to run
+
+        Returns:
+            concurrent.futures.Future: Coroutine result
+        """
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        future.add_done_callback(self._log_error)
+        return future
+
+    @staticmethod
+    def _log_error(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Coroutine failed", exc_info=future.exception())
+
+    async def run_sync(self, func, *args, **kwargs):
+        """Run blocking function in executor
+
+        Args:
+            func (Callable): Blocking function, e.g. database action
+            *args: Function args
+            **kwargs: Function kwargs
+
+        Returns:
+            Any: Function result
+        """
+        return await self.loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+
+def run_coroutine(coroutine_function):
+    """Run handler coroutine in bot event loop
+
+    Replaces `run_async` in asyncio execution mode, dispatcher thread
+    only schedules coroutine and returns to next update.
+
+    Args:
+        coroutine_function (Callable): Handler coroutine function
+
+    Returns:
+        Callable: Handler callback
+    """
+
+    @functools.wraps(coroutine_function)
+    def callback(update, context):
+        context.bot.aio.submit(coroutine_function(update, context))
+
+    return callback
@@ -1,6 +1,7 @@
 from . import admin
 
 from .start import start_handler
-from .get import get_handler
-from .subreddit import r_handler
-from .timezone import timezone_handler, set_timezone
+from .get import get_handler, get_handler_async
+from .subreddit import r_handler, r_handler_async
+from .timezone import timezone_handler, set_timezone, set_timezone_async
+from .schedule import schedule_handler
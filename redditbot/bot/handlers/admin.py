@@ -1,12 +1,51 @@
 import os
+import html
+import time
 import logging
+import tempfile
+from datetime import datetime
 
+from telegram.error import BadRequest
 from telegram.ext.dispatcher import run_async
 
 from log import LOG_PATH
+from .utils import format_counts
 
 logger = logging.getLogger(__name__)
 
+PROGRESS_INTERVAL = 2
+
+
+class _Progress:
+    """Report long running operation progress in one edited message
+
+    Args:
+        message (telegram.Message): Message to reply with progress
+        title (str): Operation title
+        interval (int | float): Min seconds between message edits
+    """
+
+    def __init__(self, message, title, interval=PROGRESS_INTERVAL):
+        self.title = title
+        self.interval = interval
+        self.counts = {}
+        self._edited = time.monotonic()
+        self._message = message.reply_html(f"{title}...", queued=False)
+
+    def __call__(self, tablename, count):
+        self.counts[tablename] = count
+        now = time.monotonic()
+        if now - self._edited >= self.interval:
+            self._edited = now
+            self.update(f"{self.title}...\n{format_counts(self.counts)}")
+
+    def update(self, text):
+        try:
+            self._message.edit_text(text, parse_mode="HTML")
+        except BadRequest as err:
+            # Message is not modified or deleted
+            logger.debug(f"Progress not updated: {err}")
+
 
 @run_async
 def log_handler(update, context):
@@ -22,6 +61,25 @@ def log_handler(update, context):
         update.effective_message.reply_html(f'Log file not found\n<code>{LOG_PATH}</code>')
 
 
+@run_async
+def stats_handler(update, context):
+    """Send messages queue and reddit client stats
+
+    Args:
+        update (telegram.Update): Object represents an incoming update.
+        context (telegram.ext.CallbackContext): Telegram bot context
+    """
+    stats = context.bot.scheduler.stats
+    text = (
+        f"<b>Queue depth</b>: {stats['depth']} messages, {stats['chats']} chats\n"
+        f"<b>Sent</b>: {stats['sent']}, retries: {stats['retries']}\n"
+        f"<b>Wait</b>: avg {stats['wait_avg']:.2f}s, max {stats['wait_max']:.2f}s\n"
+        f"<b>Reddit cache</b>: <code>{context.bot.reddit.cache}</code>\n"
+        f"<b>Reddit limiter</b>: <code>{context.bot.reddit.limiter}</code>"
+    )
+    update.effective_message.reply_html(text)
+
+
 @run_async
 def dump_handler(update, context):
     """Send database dump
@@ -30,12 +88,15 @@ def dump_handler(update, context):
         update (telegram.Update): Object represents an incoming update.
         context (telegram.ext.CallbackContext): Telegram bot context
     """
-    with context.bot.db.create_dump() as dump_file:
-        caption = "\n".join(
-            f"<b>{tablename}</b>: {len(data)} rows"
-            for tablename, data in dump_file.data.items()
+    progress = _Progress(update.effective_message, "Creating dump")
+    with context.bot.db.create_dump(progress) as dump_file:
+        update.effective_message.reply_document(
+            dump_file,
+            filename=dump_file.file_name,
+            caption=format_counts(dump_file.counts),
+            parse_mode='HTML',
         )
-        update.effective_message.reply_document(dump_file, caption=caption, parse_mode='HTML')
+    progress.update(f"Dump created:\n{format_counts(dump_file.counts)}")
 
 
 @run_async
@@ -47,26 +108,57 @@ def restore_handler(update, context):
         context (telegram.ext.CallbackContext): Telegram bot context
     """
     message = update.effective_message
-    if message.document.file_name == context.bot.db.DUMP_FILE_NAME:
-        dump_file = message.document.get_file()
-        restore_result = context.bot.db.restore_dump(dump_file.download_as_bytearray())
-
-        restore_result_str = "\n".join(
-            f"<b>{tablename}</b>: {len(data)} rows"
-            for tablename, data in restore_result.items()
-        )
-        message.reply_html(f'Successfully restored:\n{restore_result_str}')
-    else:
+    if not context.bot.db.DUMP_FILE_PATTERN.match(message.document.file_name or ""):
         message.reply_html(f'Bad file name: <b>{message.document.file_name}</b>')
+        return
+
+    progress = _Progress(message, f"Restoring {message.document.file_name}")
+    with tempfile.TemporaryFile() as dump_file:
+        message.document.get_file().download(out=dump_file)
+        dump_file.seek(0)
+        try:
+            counts = context.bot.db.restore_dump(dump_file, progress)
+        except (ValueError, KeyError, OSError, EOFError) as err:
+            logger.error(f"Restore failed: {err!r}")
+            progress.update(f'Restore failed: <code>{html.escape(str(err))}</code>')
+            return
+
+    progress.update(f'Successfully restored:\n{format_counts(counts)}')
 
 
 @run_async
 def export_handler(update, context):
-    """Send exported database in csv format
+    """Send exported database in csv format in one zip archive
+
+    Usage: `/export [table ...] [since=YYYY-MM-DD] [columns=name,...]`,
+    e.g. `/export users since=2020-05-01 columns=id,first_name`
 
     Args:
         update (telegram.Update): Object represents an incoming update.
         context (telegram.ext.CallbackContext): Telegram bot context
     """
-    for csv_file in context.bot.db.export_csv():
-        update.effective_message.reply_document(csv_file)
+    message = update.effective_message
+    tablenames, options = [], {}
+    for arg in context.args or ():
+        if "=" in arg:
+            name, value = arg.split("=", 1)
+            options[name.lower()] = value
+        else:
+            tablenames.append(arg.lower())
+
+    try:
+        since = options.get("since")
+        if since:
+            since = datetime.fromisoformat(since)
+        columns = options.get("columns")
+        if columns:
+            columns = [column.strip() for column in columns.split(",")]
+        with context.bot.db.export_csv(tablenames, columns, since) as zip_file:
+            message.reply_document(
+                zip_file,
+                filename=zip_file.file_name,
+                caption=format_counts(zip_file.counts),
+                parse_mode='HTML',
+            )
+    except ValueError as err:
+        message.reply_html(f'Export failed: <code>{html.escape(str(err))}</code>')
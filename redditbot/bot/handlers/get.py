@@ -1,31 +1,73 @@
 from telegram.ext.dispatcher import run_async
 
-from .utils import build_message, get_subreddit_from_context, get_subreddit_link
+from reddit import RedditError
+from ..aio import run_coroutine
+from .utils import get_subreddit_from_context, get_subreddit_link, split_message
 
 
-def _get_subreddit_message(context):
+def _get_subreddit_message(context, user):
     """Get message for selected subreddit from context
 
     Args:
         context (telegram.ext.CallbackContext): Telegram bot context
+        user (telegram.User): Telegram user instance
 
     Returns:
         str: Message to send
     """
     subreddit = get_subreddit_from_context(context)
-    data = context.bot.reddit.get_subreddit_top_posts(subreddit.text)
-    posts_message = build_message(data)
-    if posts_message:
-        message = f"Subreddit: {subreddit.link}\n"
-        message += posts_message
-    else:
-        message = f"No posts found for subreddit {subreddit.link}"
+    try:
+        data = context.bot.reddit.get_subreddit_top_posts(subreddit.text)
+    except RedditError:
+        return f"Failed to get posts for subreddit {subreddit.link}, try again later"
 
-    return message
+    return _render_message(context, subreddit.text, data, user)
 
 
-def _get_all_messages(context, user):
+async def _get_subreddit_message_async(context, user):
+    """Get message for selected subreddit from context in event loop
+
+    Args:
+        context (telegram.ext.CallbackContext): Telegram bot context
+        user (telegram.User): Telegram user instance
+
+    Returns:
+        str: Message to send
     """
+    subreddit = get_subreddit_from_context(context)
+    try:
+        data = await context.bot.aio_reddit.get_subreddit_top_posts(subreddit.text)
+    except RedditError:
+        return f"Failed to get posts for subreddit {subreddit.link}, try again later"
+
+    return _render_message(context, subreddit.text, data, user)
+
+
+def _render_message(context, subreddit_title, data, user):
+    """Render subreddit posts message
+
+    Args:
+        context (telegram.ext.CallbackContext): Telegram bot context
+        subreddit_title (str): Subreddit title
+        data (reddit.models.Listing | None): Subreddit posts, None if request failed
+        user (telegram.User): Telegram user instance
+
+    Returns:
+        str: Message to send
+    """
+    link = get_subreddit_link(subreddit_title)
+    if data is None:
+        return f"Failed to get posts for subreddit {link}, try again later"
+
+    message = context.bot.renderer.render(subreddit_title, data, user)
+    return message or f"No posts found for subreddit {link}"
+
+
+def _get_all_messages(context, user):
+    """Get messages of all user subscriptions in subscriptions order
+
+    Message is yielded as soon as posts of its and all previous
+    subreddits are loaded.
 
     Args:
         context (telegram.ext.CallbackContext): Telegram bot context
@@ -34,11 +76,59 @@ def _get_all_messages(context, user):
     Yields:
         str: Message to send
     """
-    for subreddit in context.bot.db.get_user_subreddit(user.id):
-        data = context.bot.reddit.get_subreddit_top_posts(subreddit.title, limit=5)
-        message = f"Subreddit: {get_subreddit_link(subreddit.title)}\n"
-        message += build_message(data)
-        yield message
+    subreddits = context.bot.db.get_user_subreddits_titles(user.id)
+    subreddits = list(dict.fromkeys(subreddits))
+    posts = context.bot.reddit.get_many_top_posts(subreddits, limit=5)
+    loaded = {}
+    ready = 0
+    for subreddit_title, data in posts:
+        loaded[subreddit_title] = data
+        while ready < len(subreddits) and subreddits[ready] in loaded:
+            data = loaded.pop(subreddits[ready])
+            yield _render_message(context, subreddits[ready], data, user)
+            ready += 1
+
+
+async def _get_all_messages_async(context, user):
+    """Get messages of all user subscriptions in subscriptions order in event loop
+
+    Args:
+        context (telegram.ext.CallbackContext): Telegram bot context
+        user (telegram.User): Telegram user instance
+
+    Returns:
+        List[str]: Messages to send
+    """
+    subreddits = await context.bot.aio.run_sync(
+        context.bot.db.get_user_subreddits_titles, user.id
+    )
+    posts = context.bot.aio_reddit.get_many_top_posts(subreddits, limit=5)
+    loaded = {subreddit_title: data async for subreddit_title, data in posts}
+    return [
+        _render_message(context, subreddit_title, loaded[subreddit_title], user)
+        for subreddit_title in dict.fromkeys(subreddits)
+    ]
+
+
+def _reply_messages(update, context, messages):
+    """Reply with messages, packed in digest mode
+
+    Args:
+        update (telegram.Update): Object represents an incoming update.
+        context (telegram.ext.CallbackContext): Telegram bot context
+        messages (Iterable[str]): Messages to send
+    """
+    replied = False
+    if context.bot.news_digest:
+        messages = split_message(messages)
+
+    for text in messages:
+        replied = True
+        update.effective_message.reply_html(text, disable_web_page_preview=True)
+
+    if not replied:
+        text = "You have no subscriptions"
+        update.effective_message.reply_html(text, disable_web_page_preview=True)
 
 
 @run_async
@@ -54,14 +144,24 @@ def get_handler(update, context):
         context (telegram.ext.CallbackContext): Telegram bot context
     """
     if context.args:
-        text = _get_subreddit_message(context)
+        text = _get_subreddit_message(context, update.effective_user)
+        update.effective_message.reply_html(text, disable_web_page_preview=True)
+    else:
+        messages = _get_all_messages(context, update.effective_user)
+        _reply_messages(update, context, messages)
+
+
+@run_coroutine
+async def get_handler_async(update, context):
+    """Get command handler for asyncio execution mode
+
+    Args:
+        update (telegram.Update): Object represents an incoming update.
+        context (telegram.ext.CallbackContext): Telegram bot context
+    """
+    if context.args:
+        text = await _get_subreddit_message_async(context, update.effective_user)
         update.effective_message.reply_html(text, disable_web_page_preview=True)
     else:
-        replied = False
-        for text in _get_all_messages(context, update.effective_user):
-            replied = True
-            update.effective_message.reply_html(text, disable_web_page_preview=True)
-
-        if not replied:
-            text = "You have no subscriptions"
-            update.effective_message.reply_html(text, disable_web_page_preview=True)
+        messages = await _get_all_messages_async(context, update.effective_user)
+        _reply_messages(update, context, messages)
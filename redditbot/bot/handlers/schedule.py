@@ -0,0 +1,125 @@
+from datetime import timezone
+
+from telegram.ext.dispatcher import run_async
+
+from timezones import get_tzinfo, HOURLY, DAILY, WEEKLY, CADENCES
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+SCHEDULE_USAGE = (
+    "<code>/schedule 09:30</code> - Send news daily at 09:30\n"
+    "<code>/schedule weekly sat 10:00</code> - Send news on Saturdays at 10:00\n"
+    "<code>/schedule hourly :15</code> - Send news every hour at :15"
+)
+
+
+def _parse_time(arg):
+    """Parse `HH:MM` or `:MM` local time
+
+    Args:
+        arg (str): Command argument
+
+    Returns:
+        int | None: Minutes, None if argument is not time
+    """
+    hours, separator, minutes = arg.partition(":")
+    if not separator or not minutes.isdigit() or (hours and not hours.isdigit()):
+        return None
+    hours, minutes = int(hours or 0), int(minutes)
+    if hours > 23 or minutes > 59:
+        return None
+    return hours * 60 + minutes
+
+
+def _parse_schedule(args):
+    """Parse schedule command arguments in any order
+
+    Args:
+        args (List[str]): Command arguments
+
+    Returns:
+        Tuple[int, str, int | None] | None: News time in minutes, cadence
+            and weekday, None if arguments are not valid
+    """
+    news_time = weekday = None
+    cadence = DAILY
+    for arg in args:
+        arg = arg.lower()
+        if arg in CADENCES:
+            cadence = arg
+        elif arg[:3] in WEEKDAYS:
+            weekday = WEEKDAYS.index(arg[:3])
+        elif _parse_time(arg) is not None:
+            news_time = _parse_time(arg)
+        else:
+            return None
+
+    if weekday is not None and cadence == DAILY:
+        cadence = WEEKLY
+    if news_time is None:
+        return None
+    if cadence == WEEKLY and weekday is None:
+        weekday = 0
+    if cadence != WEEKLY:
+        weekday = None
+    return news_time, cadence, weekday
+
+
+def _format_schedule(context, schedule):
+    """Format user schedule
+
+    Args:
+        context (telegram.ext.CallbackContext): Telegram bot context
+        schedule (Tuple): User `db.SCHEDULE_COLUMNS`
+
+    Returns:
+        str: Html text
+    """
+    if schedule is None or schedule.news_time_min is None:
+        news_time, cadence, weekday = context.bot.news_time, DAILY, None
+    else:
+        news_time = schedule.news_time_min
+        cadence = schedule.news_cadence or DAILY
+        weekday = schedule.news_weekday
+
+    hours, minutes = divmod(news_time, 60)
+    if cadence == HOURLY:
+        text = f"Your news: <b>hourly</b> at <b>:{minutes:02}</b>"
+    elif cadence == WEEKLY:
+        text = (
+            f"Your news: <b>weekly</b> on <b>{WEEKDAYS[weekday or 0]}</b> "
+            f"at <b>{hours:02}:{minutes:02}</b>"
+        )
+    else:
+        text = f"Your news: <b>daily</b> at <b>{hours:02}:{minutes:02}</b>"
+
+    if schedule is not None and schedule.next_delivery_utc is not None:
+        tz = get_tzinfo(schedule.timezone, schedule.utc_offset_min)
+        next_delivery = schedule.next_delivery_utc.replace(tzinfo=timezone.utc)
+        text += f"\nNext: {next_delivery.astimezone(tz):%a %Y-%m-%d %H:%M}"
+    return text
+
+
+@run_async
+def schedule_handler(update, context):
+    """Get or set news delivery time and cadence
+
+    Args:
+        update (telegram.Update): Object represents an incoming update.
+        context (telegram.ext.CallbackContext): Telegram bot context
+    """
+    message = update.effective_message
+    user = update.effective_user
+    if not context.args:
+        schedule = context.bot.db.get_user_schedule(user.id)
+        message.reply_html(f"{_format_schedule(context, schedule)}\n\n{SCHEDULE_USAGE}")
+        return
+
+    parsed = _parse_schedule(context.args)
+    if parsed is None:
+        message.reply_html(f"Bad schedule\n\n{SCHEDULE_USAGE}")
+        return
+
+    context.bot.db.set_schedule(user, *parsed)
+    context.bot.news_scheduler.wake()
+    schedule = context.bot.db.get_user_schedule(user.id)
+    message.reply_html(_format_schedule(context, schedule))
@@ -21,7 +21,12 @@ def start_handler(update, context):
         f"<code>/r</code> - Get all your subscriptions\n"
         f"<code>/r python</code> - Subscribe to python subreddit\n"
         f"<code>/r -python</code> - Unsubscribe from python subreddit\n"
+        f"<code>/r python rust -java</code> - Update many subscriptions\n"
         f"<code>/get</code> - Send all posts now\n"
-        f"<code>/get python</code> - Send python posts now"
+        f"<code>/get python</code> - Send python posts now\n"
+        f"<code>/schedule</code> - Get your news schedule\n"
+        f"<code>/schedule 09:30</code> - Send news daily at 09:30\n"
+        f"<code>/schedule weekly sat 10:00</code> - Send news on Saturdays\n"
+        f"<code>/schedule hourly :15</code> - Send news every hour"
     )
     update.effective_message.reply_html(text, reply_markup=LOCATION_MARKUP)
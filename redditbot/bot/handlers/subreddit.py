@@ -1,5 +1,15 @@
+import html
+
 from telegram.ext.dispatcher import run_async
-from .utils import get_subreddit_from_context, get_subreddit_link
+
+from ..aio import run_coroutine
+from .utils import get_subreddits_from_context, get_subreddit_link
+
+R_USAGE = (
+    "<code>/r python</code> - to subscribe <i>python</i> subreddit\n"
+    "<code>/r -python</code> - to unsubscribe <i>python</i> subreddit\n"
+    "<code>/r python -java</code> - to update many subscriptions at once"
+)
 
 
 def _get_all_subscriptions(context, user):
@@ -13,48 +23,98 @@ def _get_all_subscriptions(context, user):
         str: Result message
     """
     text = ""
-    user_subreddits = context.bot.db.get_user_subreddit(user.id)
-    for idx, subreddit in enumerate(user_subreddits, 1):
+    user_subreddits = context.bot.db.get_user_subreddits_titles(user.id)
+    for idx, subreddit_title in enumerate(user_subreddits, 1):
         if not text:
             text += "Your subscriptions:\n"
         else:
             text += "\n"
-        text += f"<b>{idx}.</b> {get_subreddit_link(subreddit.title)}"
+        text += f"<b>{idx}.</b> {get_subreddit_link(subreddit_title)}"
 
     if not text:
-        text = (
-            "You have no subscriptions yet\n"
-            "<code>/r python</code> - to subscribe <i>python</i> subreddit"
-        )
+        text = f"You have no subscriptions yet\n{R_USAGE}"
     return text
 
 
-def _subscribe(context, user):
-    """Subscribe
+def _get_subscriptions_changes(subreddits, subscribed):
+    """Get subreddits to check on reddit and to unsubscribe
 
     Args:
-        context (telegram.ext.CallbackContext): Telegram bot context
-        user (telegram.User): Telegram user
+        subreddits (List[Tuple[Subreddit, bool]]): Command subreddits
+            and unsubscribe flags
+        subscribed (Set[str]): Already subscribed subreddits titles
 
     Returns:
-        str: Result message
+        Tuple[List[str], List[str]]: Subreddits titles to check and to unsubscribe
+    """
+    to_check = [
+        subreddit.text
+        for subreddit, unsubscribe in subreddits
+        if not unsubscribe and subreddit.text not in subscribed
+    ]
+    to_unsubscribe = [
+        subreddit.text
+        for subreddit, unsubscribe in subreddits
+        if unsubscribe and subreddit.text in subscribed
+    ]
+    return to_check, to_unsubscribe
+
+
+def _format_subscriptions_result(subreddits, invalid, ignored, subscribed, has_posts):
+    """Format subscriptions update result
+
+    Args:
+        subreddits (List[Tuple[Subreddit, bool]]): Command subreddits
+            and unsubscribe flags
+        invalid (List[str]): Command arguments not valid subreddit names
+        ignored (List[Subreddit]): Subreddits over command limit
+        subscribed (Set[str]): Subscribed before update subreddits titles
+        has_posts (Dict[str, bool | None]): Checked subreddits,
+            None if check failed
+
+    Returns:
+        str: Result message, usage if command has no subreddits
     """
-    subreddit = get_subreddit_from_context(context)
-    subscription = context.bot.db.Subscription.get(user.id, subreddit.text)
-    if subscription is None:
-        if context.bot.reddit.is_subreddit_has_posts(subreddit.text):
-            context.bot.db.subscribe(user, subreddit.text)
-            text = f"Subscription to {subreddit.html} success"
+    lines = []
+    if invalid:
+        lines.append(
+            "Invalid subreddit names: "
+            f"{', '.join(f'<b>{html.escape(arg)}</b>' for arg in invalid)}"
+        )
+    if not subreddits:
+        lines.append(f"No subreddits found in command\n{R_USAGE}")
+        return "\n".join(lines)
+
+    for subreddit, unsubscribe in subreddits:
+        if unsubscribe:
+            if subreddit.text in subscribed:
+                lines.append(f"Successfully unsubscribed from {subreddit.html}")
+            else:
+                lines.append(f"You are not subscribed to {subreddit.html}")
+        elif subreddit.text in subscribed:
+            lines.append(f"You already subscribed to {subreddit.html}")
+        elif has_posts[subreddit.text] is None:
+            lines.append(
+                f"Failed to check subreddit {subreddit.html}, try again later"
+            )
+        elif has_posts[subreddit.text]:
+            lines.append(f"Subscription to {subreddit.html} success")
         else:
-            text = f"No posts found for subreddit {subreddit.html}"
-    else:
-        text = f"You already subscribed to {subreddit.html}"
+            lines.append(f"No posts found for subreddit {subreddit.html}")
+
+    if ignored:
+        lines.append(
+            f"Only {len(subreddits)} subreddits are updated at once, ignored: "
+            f"{', '.join(subreddit.html for subreddit in ignored)}"
+        )
+    return "\n".join(lines)
 
-    return text
 
+def _update_subscriptions(context, user):
+    """Subscribe and unsubscribe to subreddits from command arguments
 
-def _unsubscribe(context, user):
-    """Unsubscribe
+    Subscriptions are checked with one query, new subreddits are checked
+    on reddit concurrently and all changes are saved in one transaction.
 
     Args:
         context (telegram.ext.CallbackContext): Telegram bot context
@@ -63,15 +123,62 @@ def _unsubscribe(context, user):
     Returns:
         str: Result message
     """
-    subreddit = get_subreddit_from_context(context)
-    subscription = context.bot.db.Subscription.get(user.id, subreddit.text)
-    if subscription is None:
-        text = f"You are not subscribed to {subreddit.html}"
-    else:
-        context.bot.db.unsubscribe(user.id, subreddit.text)
-        text = f"Successfully unsubscribed from {subreddit.html}"
+    subreddits, invalid, ignored = get_subreddits_from_context(context)
+    subscribed = context.bot.db.get_subscribed_titles(
+        user.id, [subreddit.text for subreddit, _ in subreddits]
+    )
+    to_check, to_unsubscribe = _get_subscriptions_changes(subreddits, subscribed)
+
+    reddit = context.bot.reddit
+    has_posts = {
+        subreddit_title: None if data is None else reddit.has_posts(data)
+        for subreddit_title, data in reddit.get_many_top_posts(to_check)
+    }
+    to_subscribe = [title for title, posts in has_posts.items() if posts]
+    if to_subscribe or to_unsubscribe:
+        context.bot.db.update_subscriptions(user, to_subscribe, to_unsubscribe)
+        # New users are scheduled by news job
+        context.bot.news_scheduler.wake()
+
+    return _format_subscriptions_result(
+        subreddits, invalid, ignored, subscribed, has_posts
+    )
+
+
+async def _update_subscriptions_async(context, user):
+    """Subscribe and unsubscribe to subreddits from command arguments in event loop
 
-    return text
+    Args:
+        context (telegram.ext.CallbackContext): Telegram bot context
+        user (telegram.User): Telegram user
+
+    Returns:
+        str: Result message
+    """
+    aio = context.bot.aio
+    subreddits, invalid, ignored = get_subreddits_from_context(context)
+    subscribed = await aio.run_sync(
+        context.bot.db.get_subscribed_titles,
+        user.id,
+        [subreddit.text for subreddit, _ in subreddits],
+    )
+    to_check, to_unsubscribe = _get_subscriptions_changes(subreddits, subscribed)
+
+    reddit = context.bot.aio_reddit
+    has_posts = {
+        subreddit_title: None if data is None else reddit.has_posts(data)
+        async for subreddit_title, data in reddit.get_many_top_posts(to_check)
+    }
+    to_subscribe = [title for title, posts in has_posts.items() if posts]
+    if to_subscribe or to_unsubscribe:
+        await aio.run_sync(
+            context.bot.db.update_subscriptions, user, to_subscribe, to_unsubscribe
+        )
+        context.bot.news_scheduler.wake()
+
+    return _format_subscriptions_result(
+        subreddits, invalid, ignored, subscribed, has_posts
+    )
 
 
 @run_async
@@ -82,6 +189,7 @@ def r_handler(update, context):
         /r - Get all subscriptions
         /r <subreddit> - Subscribe to subreddit
         /r -<subreddit> - Unsubscribe from subreddit
+        /r <subreddit> -<subreddit> ... - Update many subscriptions at once
 
     Args:
         update (telegram.Update): Object represents an incoming update.
@@ -91,10 +199,23 @@ def r_handler(update, context):
     if not context.args:
         text = _get_all_subscriptions(context, user)
     else:
-        unsubscribe = context.args[0].startswith("-")
-        if unsubscribe:
-            text = _unsubscribe(context, user)
-        else:
-            text = _subscribe(context, user)
+        text = _update_subscriptions(context, user)
+
+    update.effective_message.reply_html(text, disable_web_page_preview=True)
+
+
+@run_coroutine
+async def r_handler_async(update, context):
+    """Subreddit command handler for asyncio execution mode
+
+    Args:
+        update (telegram.Update): Object represents an incoming update.
+        context (telegram.ext.CallbackContext): Telegram bot context
+    """
+    user = update.effective_user
+    if not context.args:
+        text = await context.bot.aio.run_sync(_get_all_subscriptions, context, user)
+    else:
+        text = await _update_subscriptions_async(context, user)
 
     update.effective_message.reply_html(text, disable_web_page_preview=True)
@@ -1,6 +1,9 @@
 from telegram import KeyboardButton, ReplyKeyboardMarkup
 from telegram.ext.dispatcher import run_async
 
+from timezones import TimeZoneError, utc_offset
+from ..aio import run_coroutine
+
 
 LOCATION_MARKUP = ReplyKeyboardMarkup(
     [[KeyboardButton(text="📍 Send location to set timezone", request_location=True)]],
@@ -21,6 +24,21 @@ def timezone_handler(update, context):
     update.effective_message.reply_html(text, reply_markup=LOCATION_MARKUP)
 
 
+def _format_timezone(tz_id, offset):
+    """Format timezone
+
+    Args:
+        tz_id (str): IANA timezone id
+        offset (int): Current utc offset in seconds
+
+    Returns:
+        str: Message text
+    """
+    hours, minutes = divmod(abs(offset) // 60, 60)
+    sign = "-" if offset < 0 else "+"
+    return f"Your timezone is {tz_id} (UTC{sign}{hours:02}:{minutes:02})"
+
+
 @run_async
 def set_timezone(update, context):
     """Set timezone from location
@@ -30,15 +48,48 @@ def set_timezone(update, context):
         context (telegram.ext.CallbackContext): Telegram bot context
     """
     message = update.effective_message
-    if context.bot.tz_api:
-        data = context.bot.tz_api.get_timezone(
-            message.location.latitude, message.location.longitude
-        )
-        if data['status'] == "OK":
-            text = f"Your timezone is {data['timeZoneId']} ({data['timeZoneName']})"
-            context.bot.db.set_timezone(update.effective_user, data['rawOffset'])
+    if context.bot.timezones.enabled:
+        try:
+            tz_id = context.bot.timezones.resolve(
+                message.location.latitude, message.location.longitude
+            )
+            offset = utc_offset(tz_id)
+        except TimeZoneError as err:
+            text = f"Timezone not found: <code>{err}</code>"
+        else:
+            text = _format_timezone(tz_id, offset)
+            context.bot.db.set_timezone(update.effective_user, offset, tz_id)
+            context.bot.news_scheduler.wake()
+
+    else:
+        text = "Sorry, administrator disabled this function"
+    message.reply_html(text)
+
+
+@run_coroutine
+async def set_timezone_async(update, context):
+    """Set timezone from location for asyncio execution mode
+
+    Args:
+        update (telegram.Update): Object represents an incoming update.
+        context (telegram.ext.CallbackContext): Telegram bot context
+    """
+    message = update.effective_message
+    run_sync = context.bot.aio.run_sync
+    if context.bot.timezones.enabled:
+        try:
+            tz_id = await context.bot.timezones.resolve_async(
+                message.location.latitude, message.location.longitude, run_sync
+            )
+            offset = utc_offset(tz_id)
+        except TimeZoneError as err:
+            text = f"Timezone not found: <code>{err}</code>"
         else:
-            text = f"Error response from api: <code>{data['status']}: {data['errorMessage']}</code>"
+            text = _format_timezone(tz_id, offset)
+            await run_sync(
+                context.bot.db.set_timezone, update.effective_user, offset, tz_id
+            )
+            context.bot.news_scheduler.wake()
 
     else:
         text = "Sorry, administrator disabled this function"
@@ -1,25 +1,122 @@
+import re
+import html
 from collections import namedtuple
 
 Subreddit = namedtuple('Subreddit', ['text', 'html', 'link'])
+MESSAGE_MAX_LENGTH = 4096
+MAX_SUBREDDITS_PER_COMMAND = 30
+SUBREDDIT_NAME_RE = re.compile(r"^[a-z0-9_]{1,21}$")
 
 
-def build_message(data):
-    message = ""
-    for item in data.get('data', {}).get('children', []):
-        score = item["data"]["score"]
-        title = item["data"]["title"]
-        url = item["data"]["url"]
-        message += f"<b>{score}</b> <a href='{url}'>{title}</a>\n"
+def _safe_cut(text, max_length):
+    """Last position not inside html tag or entity to cut text at"""
+    cut = max_length
+    tag = text.rfind("<", 0, cut)
+    if tag > text.rfind(">", 0, cut):
+        cut = tag
+    entity = text.rfind("&", 0, cut)
+    if entity > text.rfind(";", 0, cut):
+        cut = entity
+    # Whole text is one tag, hard cut is the only option
+    return cut or max_length
 
-    return message
+
+def _shorten(text, max_length):
+    if len(text) <= max_length:
+        return text
+    return text[:_safe_cut(text, max_length - 1)] + "…"
+
+
+def build_message(listing, max_length=MESSAGE_MAX_LENGTH):
+    """Build posts html
+
+    Titles are shortened to fit each post line in max_length,
+    so the line is never split inside its link.
+
+    Args:
+        listing (reddit.models.Listing): Subreddit posts
+        max_length (int): Max post line length
+
+    Returns:
+        str: Posts lines, empty if no posts
+    """
+    lines = []
+    for post in listing:
+        title = html.escape(post.title, quote=False)
+        url = html.escape(post.url)
+        prefix, suffix = f"<b>{post.score}</b> <a href='{url}'>", "</a>"
+        if len(prefix) + len(suffix) >= max_length:
+            # Link itself does not fit, post is sent without it
+            prefix, suffix = f"<b>{post.score}</b> ", ""
+        title = _shorten(title, max_length - len(prefix) - len(suffix))
+        lines.append(f"{prefix}{title}{suffix}\n")
+
+    return "".join(lines)
+
+
+def _split_lines(text, max_length):
+    if len(text) <= max_length:
+        yield text
+        return
+
+    lines = []
+    length = -1
+    for line in text.split("\n"):
+        while len(line) > max_length:
+            if lines:
+                yield "\n".join(lines)
+                lines, length = [], -1
+            cut = _safe_cut(line, max_length)
+            yield line[:cut]
+            line = line[cut:]
+
+        if lines and length + 1 + len(line) > max_length:
+            yield "\n".join(lines)
+            lines, length = [], -1
+        if not line and not lines:
+            continue
+        lines.append(line)
+        length += 1 + len(line)
+    if lines:
+        yield "\n".join(lines)
+
+
+def split_message(parts, max_length=MESSAGE_MAX_LENGTH):
+    """Pack message parts into as few messages as possible
+
+    Parts are separated with empty line, part longer
+    than max_length is split by lines.
+
+    Args:
+        parts (Iterable[str]): Message parts
+        max_length (int): Max message length
+
+    Returns:
+        List[str]: Messages
+    """
+    messages = []
+    chunks = []
+    length = -2
+    for part in parts:
+        for chunk in _split_lines(part.strip("\n"), max_length):
+            if chunks and length + 2 + len(chunk) > max_length:
+                messages.append("\n\n".join(chunks))
+                chunks, length = [], -2
+            if not chunk and not chunks:
+                continue
+            chunks.append(chunk)
+            length += 2 + len(chunk)
+    if chunks:
+        messages.append("\n\n".join(chunks))
+    return messages
 
 
 def get_subreddit_link(subreddit):
     return f"<a href='https://www.reddit.com/r/{subreddit}/top/'>{subreddit}</a>"
 
 
-def get_subreddit_from_context(context):
-    subreddit = context.args[0].lower()
+def _parse_subreddit(arg):
+    subreddit = arg.lower()
     if subreddit.startswith('-'):
         subreddit = subreddit[1:]
 
@@ -29,3 +126,46 @@ def get_subreddit_from_context(context):
         get_subreddit_link(subreddit)
     )
     return res
+
+
+def get_subreddit_from_context(context):
+    return _parse_subreddit(context.args[0])
+
+
+def get_subreddits_from_context(context, max_count=MAX_SUBREDDITS_PER_COMMAND):
+    """Get subreddits from command arguments
+
+    Args:
+        context (telegram.ext.CallbackContext): Telegram bot context
+        max_count (int): Max subreddits to return
+
+    Returns:
+        Tuple[List[Tuple[Subreddit, bool]], List[str], List[Subreddit]]: Unique
+            subreddits and unsubscribe flags, invalid arguments and subreddits
+            ignored over max count
+    """
+    subreddits = {}
+    invalid = []
+    for arg in context.args:
+        subreddit = _parse_subreddit(arg)
+        if not SUBREDDIT_NAME_RE.match(subreddit.text):
+            invalid.append(arg)
+        elif subreddit.text not in subreddits:
+            subreddits[subreddit.text] = (subreddit, arg.startswith('-'))
+    subreddits = list(subreddits.values())
+    ignored = [subreddit for subreddit, _ in subreddits[max_count:]]
+    return subreddits[:max_count], invalid, ignored
+
+
+def format_counts(counts):
+    """Format rows count by table
+
+    Args:
+        counts (Dict[str, int]): Rows count by table name
+
+    Returns:
+        str: Html text
+    """
+    return "\n".join(
+        f"<b>{tablename}</b>: {count} rows" for tablename, count in counts.items()
+    )
@@ -1,27 +1,276 @@
+import time
+import heapq
 import logging
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import telegram
 import telegram.error as tg_error
-from telegram.ext import messagequeue as mq
-from telegram.ext.dispatcher import run_async
 
 logger = logging.getLogger(__name__)
 
 
+class _ChatQueue:
+    __slots__ = ("messages", "ready_at", "scheduled")
+
+    def __init__(self):
+        self.messages = deque()
+        self.ready_at = 0
+        self.scheduled = False
+
+
+class _Message:
+    __slots__ = ("chat_id", "func", "args", "kwargs", "queued_at")
+
+    def __init__(self, chat_id, func, args, kwargs):
+        self.chat_id = chat_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.queued_at = time.monotonic()
+
+
+class SendScheduler:
+    """Outgoing messages scheduler with per chat fair queues and global limit
+
+    Chats are served round-robin by their next allowed send time,
+    so one chat with many messages does not delay other chats.
+    Chats with empty queue are kept until their interval passes,
+    so messages trickling into one chat are still spaced.
+    Telegram `RetryAfter` errors pause the chat and re-queue the message.
+
+    For more information: https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this
+
+    Args:
+        all_burst_limit (int): Max messages per all_time_limit_ms for all chats
+        all_time_limit_ms (int): Global limit period in milliseconds
+        chat_interval (int | float): Min seconds between messages to private chat
+        group_interval (int | float): Min seconds between messages to group chat
+        workers (int): Sending threads count
+    """
+
+    def __init__(
+        self,
+        all_burst_limit=29,
+        all_time_limit_ms=1017,
+        chat_interval=1.0,
+        group_interval=3.0,
+        workers=4,
+    ):
+        self.all_burst_limit = all_burst_limit
+        self.all_time_limit = all_time_limit_ms / 1000
+        self.chat_interval = chat_interval
+        self.group_interval = group_interval
+
+        self._chats = {}
+        self._heap = []
+        self._idle = []
+        self._counter = itertools.count()
+        self._sent_times = deque()
+        self._cond = threading.Condition()
+        self._running = True
+
+        self._depth = 0
+        self._sent = 0
+        self._retries = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="send"
+        )
+        self._thread = threading.Thread(
+            target=self._run, name="SendScheduler", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def stats(self):
+        """Dict: Queue depth, active chats, sent messages, retries and wait times"""
+        with self._cond:
+            return {
+                "depth": self._depth,
+                "chats": sum(1 for chat in self._chats.values() if chat.messages),
+                "sent": self._sent,
+                "retries": self._retries,
+                "wait_avg": self._wait_total / self._sent if self._sent else 0.0,
+                "wait_max": self._wait_max,
+            }
+
+    def _schedule(self, chat_id, chat):
+        chat.scheduled = True
+        heapq.heappush(self._heap, (chat.ready_at, next(self._counter), chat_id))
+
+    def put(self, chat_id, func, *args, **kwargs):
+        """Queue message
+
+        Args:
+            chat_id (int): Telegram chat id, used for per chat limits
+            func (Callable): Function sending message
+            *args: Function arguments
+            **kwargs: Function keyword arguments
+        """
+        with self._cond:
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                chat = self._chats[chat_id] = _ChatQueue()
+            chat.messages.append(_Message(chat_id, func, args, kwargs))
+            self._depth += 1
+            if not chat.scheduled:
+                self._schedule(chat_id, chat)
+            self._cond.notify()
+
+    def retry(self, message, retry_after):
+        """Pause chat and put message back to the queue head
+
+        Args:
+            message (_Message): Failed message
+            retry_after (int | float): Seconds to pause chat
+        """
+        with self._cond:
+            chat = self._chats.get(message.chat_id)
+            if chat is None:
+                chat = self._chats[message.chat_id] = _ChatQueue()
+            chat.messages.appendleft(message)
+            chat.ready_at = max(chat.ready_at, time.monotonic() + retry_after)
+            self._depth += 1
+            self._retries += 1
+            if not chat.scheduled:
+                self._schedule(message.chat_id, chat)
+            self._cond.notify()
+
+    def _forget_idle(self, now):
+        # Chats without messages are needed only until next allowed send time
+        while self._idle and self._idle[0][0] <= now:
+            _, chat_id = heapq.heappop(self._idle)
+            chat = self._chats.get(chat_id)
+            if (
+                chat is not None
+                and not chat.messages
+                and not chat.scheduled
+                and chat.ready_at <= now
+            ):
+                del self._chats[chat_id]
+
+    def _next_message(self, now):
+        """Pop next message allowed to send
+
+        Returns:
+            Tuple[_Message | None, float | None]: Message or seconds to wait
+        """
+        self._forget_idle(now)
+        while self._sent_times and self._sent_times[0] <= now - self.all_time_limit:
+            self._sent_times.popleft()
+        if len(self._sent_times) >= self.all_burst_limit:
+            return None, self._sent_times[0] + self.all_time_limit - now
+
+        while self._heap:
+            ready_at, _, chat_id = self._heap[0]
+            chat = self._chats[chat_id]
+            if chat.ready_at > ready_at:
+                # Chat paused after scheduling
+                heapq.heapreplace(
+                    self._heap, (chat.ready_at, next(self._counter), chat_id)
+                )
+                continue
+            if ready_at > now:
+                return None, ready_at - now
+
+            heapq.heappop(self._heap)
+            chat.scheduled = False
+            message = chat.messages.popleft()
+            interval = self.group_interval if chat_id < 0 else self.chat_interval
+            chat.ready_at = now + interval
+            if chat.messages:
+                self._schedule(chat_id, chat)
+            else:
+                heapq.heappush(self._idle, (chat.ready_at, chat_id))
+
+            self._depth -= 1
+            self._sent += 1
+            wait = now - message.queued_at
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._sent_times.append(now)
+            return message, None
+
+        return None, None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                message, wait = self._next_message(time.monotonic())
+                if message is None:
+                    self._cond.wait(wait)
+                    continue
+            self._executor.submit(self._deliver, message)
+
+    def _deliver(self, message):
+        try:
+            message.func(*message.args, **message.kwargs)
+        except tg_error.RetryAfter as err:
+            logger.warning(
+                f"Retry message to {message.chat_id} after {err.retry_after}s"
+            )
+            self.retry(message, err.retry_after)
+        except Exception:
+            logger.exception(f"Failed to send message to {message.chat_id}")
+
+    def stop(self):
+        """Stop scheduling, queued messages are dropped"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False)
+
+
 class MQBot(telegram.bot.Bot):
-    """A subclass of Bot which delegates send method handling to MQ"""
+    """A subclass of Bot which delegates send method handling to scheduler
+
+    Messages sent with `send_durable` are saved to database outbox
+    first and marked delivered after sending, so delivery is resumed
+    by `drain_outbox` after restart. Outbox messages are leased to
+    `worker_id`, so processes sharing database do not send them twice.
+
+    Telegram limits are per bot, so with `send_outbox=False` messages
+    are only saved and sent by the process owning the global limit.
 
-    def __init__(self, *args, is_queued_def=True, mqueue=None, **kwargs):
+    Args:
+        scheduler (SendScheduler): Outgoing messages scheduler
+        outbox_batch (int): Max outbox messages in memory queue, pending
+            messages of one chat are queued together and may exceed it
+        worker_id (str): Process id for database leases
+        lease_seconds (int | float): Database leases duration
+        send_outbox (bool): Send outbox messages from this process
+    """
+
+    def __init__(
+        self,
+        *args,
+        scheduler=None,
+        outbox_batch=1000,
+        worker_id="bot",
+        lease_seconds=600,
+        send_outbox=True,
+        **kwargs,
+    ):
         super(MQBot, self).__init__(*args, **kwargs)
-        # below 2 attributes should be provided for decorator usage
-        self._is_messages_queued_default = is_queued_def
-        self._msg_queue = mqueue or mq.MessageQueue()
+        self.scheduler = scheduler or SendScheduler()
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.send_outbox = send_outbox
+        self._outbox_batch = outbox_batch
+        self._outbox_queued = set()
+        self._outbox_lock = threading.Lock()
 
     # noinspection PyBroadException
     def __del__(self):
         try:
-            self._msg_queue.stop()
-            del self._msg_queue
+            self.scheduler.stop()
         except:
             pass
 
@@ -35,15 +284,61 @@ class MQBot(telegram.bot.Bot):
                 else:
                     logger.warning(f"Not found user {chat_id} to delete")
 
-    @run_async
-    def _send_message(self, *args, **kwargs):
+    def send_durable(self, messages):
+        """Save messages to outbox and queue them
+
+        Args:
+            messages (Iterable[Tuple[str, int, str, Dict]]): Messages unique key,
+                chat id, text and send_message kwargs
+
+        Returns:
+            int: Saved messages count, messages with already saved keys are skipped
+        """
+        saved = self.db.outbox_put(messages)
+        if saved and self.send_outbox:
+            self.drain_outbox()
+        return saved
+
+    def drain_outbox(self):
+        """Queue not delivered outbox messages
+
+        Returns:
+            int: Queued messages count
+        """
+        with self._outbox_lock:
+            limit = self._outbox_batch - len(self._outbox_queued)
+            if limit <= 0:
+                return 0
+            pending = self.db.outbox_pending(
+                limit,
+                self.worker_id,
+                self.lease_seconds,
+                exclude=self._outbox_queued,
+            )
+            self._outbox_queued.update(message[0] for message in pending)
+
+        for message_id, chat_id, text, options in pending:
+            self.send_message(chat_id, text, outbox_id=message_id, **options)
+
+        if pending:
+            logger.info(f"Queued {len(pending)} outbox messages")
+        return len(pending)
+
+    def _outbox_done(self, message_id, delivered):
         try:
-            chat_id = args[0]
-        except IndexError:
-            chat_id = kwargs.get("chat_id")
+            self.db.outbox_done(message_id, delivered)
+        finally:
+            with self._outbox_lock:
+                self._outbox_queued.discard(message_id)
 
+    def _send_message(self, chat_id, *args, outbox_id=None, **kwargs):
+        delivered = True
         try:
-            return super(MQBot, self).send_message(*args, **kwargs)
+            return super(MQBot, self).send_message(chat_id, *args, **kwargs)
+        except tg_error.RetryAfter:
+            # Message is queued again by scheduler
+            delivered = None
+            raise
         except tg_error.Unauthorized:
             logger.warning(f"Delete unauthorized user: {chat_id}")
             self.delete_user(chat_id)
@@ -60,9 +355,14 @@ class MQBot(telegram.bot.Bot):
             else:
                 logger.exception("send_message BadRequest")
         except:
+            delivered = False
             logger.exception("Unhandled exception")
+        finally:
+            if outbox_id is not None and delivered is not None:
+                self._outbox_done(outbox_id, delivered)
 
-    @mq.queuedmessage
-    def send_message(self, *args, **kwargs):
-        """Wrapped method would accept new `queued` and `isgroup` OPTIONAL arguments"""
-        self._send_message(*args, **kwargs)
+    def send_message(self, chat_id, *args, queued=True, **kwargs):
+        """Queue message to scheduler, pass `queued=False` to send immediately"""
+        if not queued:
+            return super(MQBot, self).send_message(chat_id, *args, **kwargs)
+        self.scheduler.put(chat_id, self._send_message, chat_id, *args, **kwargs)
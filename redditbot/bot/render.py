@@ -0,0 +1,231 @@
+import html
+import logging
+import functools
+import threading
+import multiprocessing
+from string import Template
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from .handlers.utils import build_message, get_subreddit_link, split_message
+
+logger = logging.getLogger(__name__)
+
+NEWS_TEMPLATE = "Subreddit: $link\n$posts"
+PERSONAL_FIELDS = ("first_name", "last_name")
+# Pool is started from running bot threads, forked children could inherit
+# locks held by them, forkserver forks from clean single threaded process
+POOL_START_METHOD = (
+    "forkserver"
+    if "forkserver" in multiprocessing.get_all_start_methods()
+    else "spawn"
+)
+
+
+def _substitute(template, subreddit, posts, user_fields=None):
+    fields = {
+        field: html.escape((user_fields or {}).get(field) or "")
+        for field in PERSONAL_FIELDS
+    }
+    return template.safe_substitute(
+        fields,
+        subreddit=subreddit,
+        link=get_subreddit_link(subreddit),
+        posts=posts,
+    )
+
+
+def _render_news_chunk(template, is_personal, digest, rendered, chunk):
+    """Render messages of users chunk, runs in renderer process pool
+
+    Args:
+        template (str): Message template
+        is_personal (bool): Template has recipient fields
+        digest (bool): Pack user subreddits into as few messages as possible
+        rendered (Dict[str, str]): Subreddits messages or posts html
+            of personal template by subreddit title
+        chunk (List[Tuple[str, int, Dict | None, List[str]]]): Message key prefix,
+            chat id, recipient fields and subreddits titles
+
+    Returns:
+        List[Tuple[str, int, str]]: Messages key, chat id and text
+    """
+    template = Template(template)
+    messages = []
+    for key_prefix, chat_id, user_fields, subreddits in chunk:
+        parts = []
+        for subreddit in subreddits:
+            text = rendered[subreddit]
+            if is_personal:
+                text = _substitute(template, subreddit, text, user_fields)
+            parts.append((subreddit, text))
+
+        if digest:
+            parts = (text for _, text in sorted(parts))
+            for idx, text in enumerate(split_message(parts)):
+                key = f"{key_prefix}:{chat_id}:digest:{idx}"
+                messages.append((key, chat_id, text))
+        else:
+            for subreddit, text in parts:
+                key = f"{key_prefix}:{chat_id}:{subreddit}"
+                messages.append((key, chat_id, text))
+    return messages
+
+
+class MessageRenderer:
+    """Render subreddit messages once and share them between recipients
+
+    Template uses `string.Template` placeholders, so posts titles
+    are never parsed as a template:
+        `$subreddit` - subreddit title
+        `$link` - subreddit html link
+        `$posts` - posts html
+        `$first_name`, `$last_name` - recipient names, makes template personal
+
+    News of many users are rendered in process pool of `processes`
+    by chunks of `chunk_size` users, so per user formatting does
+    not hold GIL of bot process.
+
+    Args:
+        template (str): Message template
+        maxsize (int): Max rendered messages to keep
+        processes (int): News rendering processes, 0 to render in caller thread
+        chunk_size (int): Users per process pool task
+    """
+
+    def __init__(
+        self, template=NEWS_TEMPLATE, maxsize=1024, processes=0, chunk_size=500
+    ):
+        self.template = Template(template)
+        self.maxsize = maxsize
+        self.is_personal = any(
+            f"${field}" in template or f"${{{field}}}" in template
+            for field in PERSONAL_FIELDS
+        )
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self._pool = None
+        self._rendered = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_user_fields(user):
+        return {field: getattr(user, field, None) for field in PERSONAL_FIELDS}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context(POOL_START_METHOD),
+                )
+            return self._pool
+
+    def close(self):
+        """Stop rendering processes"""
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def render_posts(self, subreddit, listing):
+        """Render subreddit message shared between recipients
+
+        Posts html is built once per listing version, for not personal
+        template the whole message is shared between all recipients.
+
+        Args:
+            subreddit (str): Subreddit title
+            listing (reddit.models.Listing): Subreddit posts
+
+        Returns:
+            str: Html message or posts html for personal template, empty if no posts
+        """
+        key = (subreddit, listing.version)
+        with self._lock:
+            rendered = self._rendered.get(key)
+            if rendered is not None:
+                self._rendered.move_to_end(key)
+
+        if rendered is None:
+            posts = build_message(listing)
+            if not posts:
+                rendered = ""
+            elif self.is_personal:
+                rendered = posts
+            else:
+                rendered = _substitute(self.template, subreddit, posts)
+
+            with self._lock:
+                self._rendered[key] = rendered
+                while len(self._rendered) > self.maxsize:
+                    self._rendered.popitem(last=False)
+
+        return rendered
+
+    def render(self, subreddit, listing, user=None):
+        """Render subreddit message
+
+        Args:
+            subreddit (str): Subreddit title
+            listing (reddit.models.Listing): Subreddit posts
+            user (db.User | telegram.User): Recipient for personal template
+
+        Returns:
+            str: Html message, empty if no posts
+        """
+        rendered = self.render_posts(subreddit, listing)
+        if rendered and self.is_personal:
+            return _substitute(
+                self.template, subreddit, rendered, self._get_user_fields(user)
+            )
+        return rendered
+
+    def render_news(self, news, rendered, digest=False):
+        """Render messages of many users
+
+        Args:
+            news (Iterable[Tuple[str, int, db.User | None, List[str]]]): Message
+                key prefix, chat id, recipient and subreddits titles
+            rendered (Dict[str, str]): `render_posts` results by subreddit title,
+                subreddits without posts are skipped
+            digest (bool): Pack user subreddits into as few messages as possible
+
+        Returns:
+            List[Tuple[str, int, str]]: Messages unique key, chat id and text
+        """
+        chunk = []
+        chunks = []
+        for key_prefix, chat_id, user, subreddits in news:
+            subreddits = [
+                subreddit for subreddit in subreddits if rendered.get(subreddit)
+            ]
+            if not subreddits:
+                continue
+            user_fields = self._get_user_fields(user) if self.is_personal else None
+            chunk.append((key_prefix, chat_id, user_fields, subreddits))
+            if len(chunk) >= self.chunk_size:
+                chunks.append(chunk)
+                chunk = []
+        if chunk:
+            chunks.append(chunk)
+
+        render_chunk = functools.partial(
+            _render_news_chunk, self.template.template, self.is_personal, digest
+        )
+        if self.processes <= 0 or len(chunks) <= 1:
+            results = (render_chunk(rendered, chunk) for chunk in chunks)
+        else:
+            results = self._get_pool().map(
+                render_chunk,
+                [self._get_chunk_rendered(rendered, chunk) for chunk in chunks],
+                chunks,
+            )
+        return [message for messages in results for message in messages]
+
+    @staticmethod
+    def _get_chunk_rendered(rendered, chunk):
+        # Send processes only messages of chunk subreddits
+        return {
+            subreddit: rendered[subreddit]
+            for _, _, _, subreddits in chunk
+            for subreddit in subreddits
+        }
@@ -0,0 +1,217 @@
+import ssl
+import hmac
+import time
+import logging
+from collections import OrderedDict
+
+import tornado.web
+import tornado.escape
+from telegram.error import TelegramError
+from telegram.ext import Updater
+from telegram.utils.webhookhandler import WebhookAppClass, WebhookHandler, WebhookServer
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class RecentUpdates:
+    """Bounded set of recently received update ids
+
+    Telegram repeats webhook request if bot did not answer in time,
+    repeated updates must not run commands twice.
+
+    Args:
+        maxsize (int): Max update ids to remember
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self._ids = OrderedDict()
+
+    def add(self, update_id):
+        """Remember update id
+
+        Args:
+            update_id (int): Telegram update id
+
+        Returns:
+            bool: False if update was already received
+        """
+        if update_id in self._ids:
+            return False
+        self._ids[update_id] = None
+        if len(self._ids) > self.maxsize:
+            self._ids.popitem(last=False)
+        return True
+
+
+class _SecretWebhookHandler(WebhookHandler):
+    def initialize(
+        self, bot, update_queue, default_quote=None, secret_token=None, recent=None
+    ):
+        super().initialize(bot, update_queue, default_quote)
+        self.secret_token = secret_token
+        self.recent = recent
+
+    def _validate_post(self):
+        super()._validate_post()
+        if self.secret_token is not None:
+            token = self.request.headers.get(SECRET_TOKEN_HEADER, "").encode()
+            if not hmac.compare_digest(token, self.secret_token.encode()):
+                logger.warning("Webhook request with bad secret token rejected")
+                raise tornado.web.HTTPError(403)
+
+    def post(self):
+        self._validate_post()
+        try:
+            data = tornado.escape.json_decode(self.request.body)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            logger.warning("Webhook request without update object rejected")
+            raise tornado.web.HTTPError(400)
+        update_id = data.get("update_id")
+        if not isinstance(update_id, int) or isinstance(update_id, bool):
+            # Missing id would be remembered once and drop later such updates
+            logger.warning(f"Webhook update with bad update_id {update_id!r} rejected")
+            raise tornado.web.HTTPError(400)
+        # Handlers run in one tornado loop thread, no lock needed
+        if self.recent is not None and not self.recent.add(update_id):
+            logger.info(f"Duplicate update {update_id} skipped")
+            self.set_status(200)
+            return
+        super().post()
+
+
+class _SecretWebhookApp(WebhookAppClass):
+    def __init__(self, webhook_path, shared_objects):
+        self.shared_objects = shared_objects
+        tornado.web.Application.__init__(
+            self, [(rf"{webhook_path}/?", _SecretWebhookHandler, shared_objects)]
+        )
+
+
+class WebhookUpdater(Updater):
+    """Updater with secret token check and duplicate updates filter in webhook mode
+
+    Worker processes run jobs with `start_worker` and do not receive updates.
+    Overrides private webhook methods of python-telegram-bot 12, the version
+    is pinned in requirements.txt.
+
+    Args:
+        *args: `telegram.ext.Updater` args
+        recent_updates (int): Max update ids to remember for duplicates filter
+        **kwargs: `telegram.ext.Updater` kwargs
+    """
+
+    def __init__(self, *args, recent_updates=1000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.recent_updates = RecentUpdates(recent_updates)
+        self.secret_token = None
+
+    def start_webhook(self, *args, secret_token=None, **kwargs):
+        """Start webhook server
+
+        Args:
+            *args: `telegram.ext.Updater.start_webhook` args
+            secret_token (str): Secret expected in `X-Telegram-Bot-Api-Secret-Token`
+                header of every webhook request
+            **kwargs: `telegram.ext.Updater.start_webhook` kwargs
+
+        Returns:
+            queue.Queue: Updates queue
+        """
+        self.secret_token = secret_token
+        return super().start_webhook(*args, **kwargs)
+
+    def start_worker(self):
+        """Start job queue and dispatcher threads without receiving updates"""
+        self.running = True
+        self.job_queue.start()
+        self._init_thread(self.dispatcher.start, "dispatcher")
+
+    def _start_webhook(
+        self,
+        listen,
+        port,
+        url_path,
+        cert,
+        key,
+        bootstrap_retries,
+        clean,
+        webhook_url,
+        allowed_updates,
+    ):
+        if not url_path.startswith("/"):
+            url_path = f"/{url_path}"
+        app = _SecretWebhookApp(
+            url_path,
+            {
+                "bot": self.bot,
+                "update_queue": self.update_queue,
+                "default_quote": self._default_quote,
+                "secret_token": self.secret_token,
+                "recent": self.recent_updates,
+            },
+        )
+
+        ssl_ctx = None
+        if cert is not None and key is not None:
+            try:
+                ssl_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+                ssl_ctx.load_cert_chain(cert, key)
+            except ssl.SSLError:
+                raise TelegramError("Invalid SSL Certificate")
+            if not webhook_url:
+                webhook_url = self._gen_webhook_url(listen, port, url_path)
+
+        self.httpd = WebhookServer(listen, port, app, ssl_ctx)
+        # Webhook behind reverse proxy is set when its public url is known
+        if webhook_url:
+            self._set_webhook(
+                webhook_url,
+                cert if ssl_ctx is not None else None,
+                bootstrap_retries,
+                clean,
+                allowed_updates,
+            )
+        self.httpd.serve_forever()
+
+    def _set_webhook(self, webhook_url, cert, max_retries, clean, allowed_updates):
+        """Set webhook with secret token, retry on telegram errors
+
+        Args:
+            webhook_url (str): Public webhook url
+            cert (str | None): Certificate path to upload for self-signed certificate
+            max_retries (int): Max retries, < 0 to retry indefinitely
+            clean (bool): Drop pending updates
+            allowed_updates (List[str] | None): Update types to receive
+        """
+        kwargs = {"drop_pending_updates": clean}
+        if self.secret_token is not None:
+            kwargs["secret_token"] = self.secret_token
+
+        retries = 0
+        while True:
+            try:
+                if cert is not None:
+                    with open(cert, "rb") as certificate:
+                        self.bot.set_webhook(
+                            url=webhook_url,
+                            certificate=certificate,
+                            allowed_updates=allowed_updates,
+                            **kwargs,
+                        )
+                else:
+                    self.bot.set_webhook(
+                        url=webhook_url, allowed_updates=allowed_updates, **kwargs
+                    )
+                logger.info(f"Webhook set: {webhook_url}")
+                return
+            except TelegramError as err:
+                if 0 <= max_retries <= retries:
+                    raise
+                retries += 1
+                logger.warning(f"Failed to set webhook, retry {retries}: {err}")
+                time.sleep(1)
@@ -1,13 +1,41 @@
-from .base import session
-from .schema import Subreddit, User, Subscription
+from .base import session, count_queries
+from .schema import (
+    Subreddit,
+    User,
+    Subscription,
+    OutboxMessage,
+    Tombstone,
+    Backup,
+    GeohashTimezone,
+)
 from .actions import (
-    subscribe,
-    unsubscribe,
-    get_cur_subreddits,
-    get_user_subreddit,
+    update_subscriptions,
+    get_subscribers,
+    get_news_plan,
+    claim_due_users,
+    get_unscheduled_users,
+    set_next_deliveries,
+    release_users,
+    get_user_schedule,
+    get_next_delivery,
+    set_schedule,
+    get_subscribed_titles,
+    get_users_names,
+    get_user_subreddits_titles,
+    set_timezone,
+    get_geohash_timezone,
+    set_geohash_timezone,
+    outbox_put,
+    outbox_pending,
+    outbox_done,
+    outbox_cleanup,
+)
+from .dump import (
     create_dump,
     restore_dump,
     export_csv,
-    set_timezone,
+    get_backup_since,
+    backup_done,
     DUMP_FILE_NAME,
+    DUMP_FILE_PATTERN,
 )
@@ -1,139 +1,630 @@
-import csv
-import pickle
+import json
 import logging
-from contextlib import contextmanager
+from datetime import datetime, timedelta
 
-from sqlalchemy.ext import serializer
+import sqlalchemy as sa
+from sqlalchemy.exc import IntegrityError
 
-from .base import session, metadata, Session
-from .schema import User, Subreddit, Subscription
+from .base import session
+from .schema import (
+    User,
+    Subreddit,
+    Subscription,
+    OutboxMessage,
+    Tombstone,
+    GeohashTimezone,
+)
 
 logger = logging.getLogger(__name__)
-DUMP_FILE_NAME = "db.dump"
-DUMP_TABLES = (User, Subreddit, Subscription)
 
+# PostgreSQL advisory lock key serializing outbox claims
+_OUTBOX_CLAIM_LOCK = 0x6F7574626F78
 
-def subscribe(user, subreddit):
-    """Subscribe user to subreddit
+
+def update_subscriptions(user, subscribe_titles=(), unsubscribe_titles=(), retries=3):
+    """Subscribe and unsubscribe user to many subreddits in one transaction
+
+    Transaction is retried if the same subreddits, user or subscriptions
+    were created concurrently, retry selects rows created by others.
 
     Args:
         user (telegram.User): Telegram User object
-        subreddit (str): Subreddit
+        subscribe_titles (Collection[str]): Subreddits to subscribe
+        unsubscribe_titles (Collection[str]): Subreddits to unsubscribe
+        retries (int): Max transaction attempts
+
+    Returns:
+        Tuple[int, int]: Created and deleted subscriptions count
+
+    Raises:
+        IntegrityError: if concurrent updates conflict on every attempt
     """
-    with session():
-        usr = User.get_or_create(user.id, user.first_name, user.last_name)
-        subr = Subreddit.get_or_create(subreddit)
-        usr.subreddits.append(subr)
+    for attempt in range(1, retries + 1):
+        try:
+            with session() as sess:
+                return _update_subscriptions(
+                    sess, user, subscribe_titles, unsubscribe_titles
+                )
+        except IntegrityError:
+            if attempt == retries:
+                raise
+            logger.warning(
+                f"Concurrent subscriptions update of {user.id}, attempt {attempt}"
+            )
+
+
+def _update_subscriptions(sess, user, subscribe_titles, unsubscribe_titles):
+    created = deleted = 0
+    usr = User.get_or_create(user.id, user.first_name, user.last_name)
+    if subscribe_titles:
+        subreddits = dict(
+            sess.query(Subreddit.title, Subreddit.id).filter(
+                Subreddit.title.in_(subscribe_titles)
+            )
+        )
+        new_titles = [title for title in subscribe_titles if title not in subreddits]
+        if new_titles:
+            sess.execute(
+                Subreddit.__table__.insert(),
+                [{"title": title} for title in new_titles],
+            )
+            subreddits.update(
+                sess.query(Subreddit.title, Subreddit.id).filter(
+                    Subreddit.title.in_(new_titles)
+                )
+            )
+            logger.info(f"Created Subreddits {new_titles}")
 
+        subscribed_ids = {
+            subreddit_id
+            for subreddit_id, in sess.query(Subscription.subreddit_id).filter(
+                Subscription.user_id == usr.id,
+                Subscription.subreddit_id.in_(subreddits.values()),
+            )
+        }
+        new_subscriptions = [
+            {"user_id": usr.id, "subreddit_id": subreddit_id}
+            for subreddit_id in subreddits.values()
+            if subreddit_id not in subscribed_ids
+        ]
+        if new_subscriptions:
+            sess.execute(Subscription.__table__.insert(), new_subscriptions)
+            created = len(new_subscriptions)
+
+    if unsubscribe_titles:
+        subreddit_ids = sess.query(Subreddit.id).filter(
+            Subreddit.title.in_(unsubscribe_titles)
+        )
+        subscription_ids = [
+            subscription_id
+            for subscription_id, in sess.query(Subscription.id).filter(
+                Subscription.user_id == usr.id,
+                Subscription.subreddit_id.in_(subreddit_ids.subquery()),
+            )
+        ]
+        if subscription_ids:
+            deleted = (
+                sess.query(Subscription)
+                .filter(Subscription.id.in_(subscription_ids))
+                .delete(synchronize_session=False)
+            )
+            Tombstone.record(sess, Subscription.__tablename__, subscription_ids)
+
+    return created, deleted
 
-def unsubscribe(chat_id, subreddit_title):
-    """Unsubscribe user from subreddit
+
+def get_subscribers(*criterion):
+    """Get subscribers grouped by subreddit with one query
 
     Args:
-        chat_id (int): Telegram user id
-        subreddit_title (str): Subreddit
+        *criterion: Additional filter criterion, e.g. `User.id == chat_id`
+
+    Returns:
+        Dict[str, List[int]]: Subscribers chat ids by subreddit title
     """
-    with session():
-        subscription = Subscription.get(chat_id, subreddit_title)
-        if subscription:
-            subscription.delete()
+    subscribers = {}
+    with session() as sess:
+        rows = (
+            sess.query(Subreddit.title, User.id)
+            .join(Subscription, Subscription.subreddit_id == Subreddit.id)
+            .join(User, User.id == Subscription.user_id)
+            .filter(*criterion)
+            .order_by(Subreddit.title)
+        )
+        for subreddit_title, chat_id in rows:
+            subscribers.setdefault(subreddit_title, []).append(chat_id)
 
+    return subscribers
 
-def get_cur_subreddits():
-    """Yields subreddits with subscribers
 
-    Yields:
-        db.Subreddit: Subreddits
+def get_news_plan(until, since=None, lease_owner=None):
+    """Get subscribers grouped by subreddit for users with news due
+
+    Args:
+        until (datetime.datetime): Max users next delivery utc time
+        since (datetime.datetime): Min users next delivery utc time
+        lease_owner (str): Only users claimed by this worker
+
+    Returns:
+        Dict[str, List[int]]: Subscribers chat ids by subreddit title
     """
-    with session():
-        for subreddit in Subreddit.query():
-            if subreddit.users:
-                yield subreddit
+    criterion = [User.next_delivery_utc <= until]
+    if since is not None:
+        criterion.append(User.next_delivery_utc > since)
+    if lease_owner is not None:
+        criterion.append(User.lease_owner == lease_owner)
+    return get_subscribers(*criterion)
 
 
-def get_user_subreddit(chat_id, subreddit_title=None):
-    """Get subreddit
+def _claim(sess, table, criterion, order_by, limit, owner, lease_seconds, **values):
+    """Lease rows not leased by other workers with one statement
+
+    On PostgreSQL rows locked by concurrent claims are skipped with
+    `FOR UPDATE SKIP LOCKED` instead of waited for, SQLite serializes
+    writers, so concurrent claims see leases of each other.
+
+    Args:
+        sess (sqlalchemy.orm.Session): Database session
+        table (sqlalchemy.Table): Table with `id`, `lease_owner` and `lease_until`
+        criterion (List): Rows filter
+        order_by (sqlalchemy.Column): Claim order
+        limit (int): Max rows count
+        owner (str): Worker id
+        lease_seconds (int | float): Lease duration, rows of crashed worker
+            are claimed by others after it
+        **values: Additional values to set
+
+    Returns:
+        datetime.datetime: Lease time of claimed rows
+    """
+    now = datetime.utcnow()
+    lease_until = now + timedelta(seconds=lease_seconds)
+    ids = (
+        sa.select([table.c.id])
+        .where(
+            sa.and_(
+                *criterion,
+                sa.or_(table.c.lease_until.is_(None), table.c.lease_until < now),
+            )
+        )
+        .order_by(order_by)
+        .limit(limit)
+        .correlate(None)
+    )
+    if sess.bind.dialect.name == "postgresql":
+        ids = ids.with_for_update(skip_locked=True)
+    sess.execute(
+        table.update()
+        .where(table.c.id.in_(ids))
+        .values(lease_owner=owner, lease_until=lease_until, **values)
+    )
+    return lease_until
+
+
+# Users columns required to compute next delivery time
+SCHEDULE_COLUMNS = (
+    User.id,
+    User.next_delivery_utc,
+    User.timezone,
+    User.utc_offset_min,
+    User.news_time_min,
+    User.news_cadence,
+    User.news_weekday,
+)
+
+
+def claim_due_users(until, owner, lease_seconds=600, limit=500):
+    """Lease users with news due to worker
+
+    Concurrent workers claim disjoint users, lease is released by
+    `set_next_deliveries`.
+
+    Args:
+        until (datetime.datetime): Max users next delivery utc time
+        owner (str): Worker id
+        lease_seconds (int | float): Lease duration
+        limit (int): Max users count
+
+    Returns:
+        List[Tuple]: Claimed users `SCHEDULE_COLUMNS`
+    """
+    users = User.__table__
+    with session() as sess:
+        lease_until = _claim(
+            sess,
+            users,
+            [users.c.next_delivery_utc <= until],
+            users.c.next_delivery_utc,
+            limit,
+            owner,
+            lease_seconds,
+            # Leases are not backed up, keep users out of delta backup
+            updated_at=users.c.updated_at,
+        )
+        return (
+            sess.query(*SCHEDULE_COLUMNS)
+            .filter(User.lease_owner == owner, User.lease_until == lease_until)
+            .all()
+        )
+
+
+def get_unscheduled_users(limit=1000):
+    """Get new users and users with changed timezone or schedule
+
+    Args:
+        limit (int): Max users count
+
+    Returns:
+        List[Tuple]: Users `SCHEDULE_COLUMNS`
+    """
+    with session() as sess:
+        return (
+            sess.query(*SCHEDULE_COLUMNS)
+            .filter(User.next_delivery_utc.is_(None))
+            .limit(limit)
+            .all()
+        )
+
+
+def get_user_schedule(chat_id):
+    """Get user news schedule
+
+    Args:
+        chat_id (int): Telegram user chat id
+
+    Returns:
+        Tuple | None: User `SCHEDULE_COLUMNS`
+    """
+    with session() as sess:
+        return sess.query(*SCHEDULE_COLUMNS).filter(User.id == chat_id).one_or_none()
+
+
+def get_next_delivery():
+    """Get the earliest scheduled delivery time of not leased users
+
+    Returns:
+        datetime.datetime | None: Utc time, None if nothing scheduled
+    """
+    with session() as sess:
+        return (
+            sess.query(sa.func.min(User.next_delivery_utc))
+            .filter(
+                sa.or_(
+                    User.lease_until.is_(None), User.lease_until < datetime.utcnow()
+                )
+            )
+            .scalar()
+        )
+
+
+def set_next_deliveries(next_deliveries):
+    """Set users next delivery time and release their leases with one statement
+
+    Args:
+        next_deliveries (Dict[int, datetime.datetime]): Next delivery utc time
+            by user chat id
+    """
+    if not next_deliveries:
+        return
+    users = User.__table__
+    with session() as sess:
+        sess.execute(
+            users.update()
+            .where(users.c.id == sa.bindparam("_id"))
+            .values(
+                next_delivery_utc=sa.bindparam("_next_delivery_utc"),
+                lease_owner=None,
+                lease_until=None,
+                # Schedule is not backed up, keep users out of delta backup
+                updated_at=users.c.updated_at,
+            ),
+            [
+                {"_id": chat_id, "_next_delivery_utc": next_delivery_utc}
+                for chat_id, next_delivery_utc in next_deliveries.items()
+            ],
+        )
+
+
+def release_users(chat_ids, owner):
+    """Release users leases of worker without changing their schedule
+
+    Released users are claimed again by the next news job, e.g. after
+    failed delivery batch.
+
+    Args:
+        chat_ids (Iterable[int]): Users chat ids
+        owner (str): Worker id
+    """
+    chat_ids = list(chat_ids)
+    if not chat_ids:
+        return
+    users = User.__table__
+    with session() as sess:
+        sess.execute(
+            users.update()
+            .where(sa.and_(users.c.id.in_(chat_ids), users.c.lease_owner == owner))
+            .values(
+                lease_owner=None,
+                lease_until=None,
+                # Leases are not backed up, keep users out of delta backup
+                updated_at=users.c.updated_at,
+            )
+        )
+
+
+def get_users_names(chat_ids):
+    """Get users names
+
+    Args:
+        chat_ids (Iterable[int]): Telegram users ids
+
+    Returns:
+        Dict[int, Tuple]: Rows with `first_name` and `last_name` by user id
+    """
+    with session() as sess:
+        rows = sess.query(User.id, User.first_name, User.last_name).filter(
+            User.id.in_(list(chat_ids))
+        )
+        return {row.id: row for row in rows}
+
+
+def get_subscribed_titles(chat_id, subreddit_titles):
+    """Get subreddits user subscribed to with one query
+
+    Args:
+        chat_id (int): Telegram user id
+        subreddit_titles (Collection[str]): Subreddits to check
+
+    Returns:
+        Set[str]: Subscribed subreddits titles
+    """
+    if not subreddit_titles:
+        return set()
+
+    with session() as sess:
+        rows = (
+            sess.query(Subreddit.title)
+            .join(Subscription, Subscription.subreddit_id == Subreddit.id)
+            .filter(
+                Subscription.user_id == chat_id,
+                Subreddit.title.in_(subreddit_titles),
+            )
+        )
+        return {title for title, in rows}
+
+
+def get_user_subreddits_titles(chat_id):
+    """Get user subreddits titles with one query
 
     Args:
         chat_id (int): Telegram user id
-        subreddit_title (str): Subreddit
 
-    Yields:
-        db.Subreddit: Subreddits
+    Returns:
+        List[str]: Subreddits titles in subscription order
     """
-    with session():
-        user = User.get(chat_id)
-        if user:
-            for subreddit in user.subreddits:
-                if subreddit_title is None or subreddit_title == subreddit.title:
-                    yield subreddit
+    with session() as sess:
+        rows = (
+            sess.query(Subreddit.title)
+            .join(Subscription, Subscription.subreddit_id == Subreddit.id)
+            .filter(Subscription.user_id == chat_id)
+            .order_by(Subscription.id)
+        )
+        return [title for title, in rows]
 
 
-def set_timezone(user, offset_seconds):
-    """Set user offset
+def set_timezone(user, offset_seconds, timezone=None):
+    """Set user timezone, news delivery is rescheduled
 
     Args:
         user (telegram.User):
         offset_seconds (int): Offset seconds
+        timezone (str): IANA timezone id
     """
     with session():
         usr = User.get_or_create(user.id, user.first_name, user.last_name)
         usr.utc_offset_min = offset_seconds / 60
+        usr.timezone = timezone
+        usr.next_delivery_utc = None
+        usr.update()
+
+
+def set_schedule(user, news_time_min, cadence, weekday=None):
+    """Set user news time and cadence, news delivery is rescheduled
+
+    Args:
+        user (telegram.User): Telegram User object
+        news_time_min (int): Local news time in minutes
+        cadence (str): hourly, daily or weekly
+        weekday (int): Day of week for weekly news, Monday is 0
+    """
+    with session():
+        usr = User.get_or_create(user.id, user.first_name, user.last_name)
+        usr.news_time_min = news_time_min
+        usr.news_cadence = cadence
+        usr.news_weekday = weekday
+        usr.next_delivery_utc = None
         usr.update()
 
 
-@contextmanager
-def create_dump():
-    """Creating database dump"""
+def get_geohash_timezone(geohash):
+    """Get cached timezone of location
+
+    Args:
+        geohash (str): Location geohash
+
+    Returns:
+        str | None: IANA timezone id
+    """
+    with session() as sess:
+        return (
+            sess.query(GeohashTimezone.timezone)
+            .filter(GeohashTimezone.geohash == geohash)
+            .scalar()
+        )
+
+
+def set_geohash_timezone(geohash, timezone):
+    """Cache timezone of location
+
+    Args:
+        geohash (str): Location geohash
+        timezone (str): IANA timezone id
+    """
+    try:
+        with session() as sess:
+            sess.merge(GeohashTimezone(geohash=geohash, timezone=timezone))
+    except IntegrityError:
+        logger.debug(f"Concurrent timezone cache of {geohash}")
+
+
+def outbox_put(messages):
+    """Save messages for delivery, messages with existing keys are skipped
+
+    Args:
+        messages (Iterable[Tuple[str, int, str, Dict]]): Messages key,
+            chat id, text and send_message kwargs
+
+    Returns:
+        int: Saved messages count
+    """
+    messages = {message[0]: message for message in messages}
+    if not messages:
+        return 0
+
     with session() as sess:
-        db_data = {table.__tablename__: sess.query(table).all() for table in DUMP_TABLES}
-        db_dump = {
-            tablename: serializer.dumps(data) for tablename, data in db_data.items()
+        existed = {
+            key
+            for key, in sess.query(OutboxMessage.key).filter(
+                OutboxMessage.key.in_(list(messages))
+            )
         }
+        new_messages = [
+            OutboxMessage(key, chat_id, text, json.dumps(options))
+            for key, chat_id, text, options in messages.values()
+            if key not in existed
+        ]
+        sess.add_all(new_messages)
+
+    return len(new_messages)
 
-        with open(DUMP_FILE_NAME, "wb+") as dump_file:
-            pickle.dump(db_dump, dump_file)
-            dump_file.seek(0)
-            dump_file.data = db_data
-            yield dump_file
 
+def outbox_pending(limit, owner, lease_seconds=600, exclude=(), max_attempts=5):
+    """Lease not delivered messages to worker in saving order
 
-def restore_dump(dump_file_bytearray):
-    """Restoring database
+    Outbox is sharded by chat: all pending messages of a chat are
+    claimed together, and chats with messages leased by other workers
+    are skipped, so parts of one digest are sent by one worker in order.
+    Chats are claimed while their messages fit in limit, the oldest
+    chat is claimed even if it has more. Lease is released by
+    `outbox_done`.
 
     Args:
-        dump_file_bytearray (bytearray): Database dump bytearray
+        limit (int): Max messages count
+        owner (str): Worker id
+        lease_seconds (int | float): Lease duration, should be longer
+            than sending queue delay
+        exclude (Collection[int]): Messages ids to skip, e.g. already queued
+        max_attempts (int): Skip messages failed this count of times
 
     Returns:
-        Dict: Restored data
+        List[Tuple[int, int, str, Dict]]: Messages id, chat id, text and
+            send_message kwargs
     """
-    db_dump = pickle.loads(dump_file_bytearray)
-    restored = {}
+    outbox = OutboxMessage.__table__
+    now = datetime.utcnow()
+    lease_until = now + timedelta(seconds=lease_seconds)
+    pending = sa.and_(outbox.c.delivered_at.is_(None), outbox.c.attempts < max_attempts)
+    free = sa.or_(outbox.c.lease_until.is_(None), outbox.c.lease_until < now)
+    busy_chats = sa.select([outbox.c.chat_id]).where(
+        sa.and_(pending, sa.not_(free), outbox.c.lease_owner != owner)
+    )
+    claimable = sa.and_(pending, free, outbox.c.chat_id.notin_(busy_chats))
+    chats = (
+        sa.select([outbox.c.chat_id, sa.func.count()])
+        .where(claimable)
+        .group_by(outbox.c.chat_id)
+        .order_by(sa.func.min(outbox.c.id))
+        .limit(limit)
+    )
     with session() as sess:
-        for tablename, table_data in db_dump.items():
-            db_data = serializer.loads(table_data, metadata, Session)
-            for item in db_data:
-                sess.merge(item)
-            restored[tablename] = db_data
-    return restored
+        if sess.bind.dialect.name == "postgresql":
+            # Chats can not be locked with SKIP LOCKED, serialize claims instead
+            sess.execute(
+                sa.select([sa.func.pg_advisory_xact_lock(_OUTBOX_CLAIM_LOCK)])
+            )
+        chat_ids = []
+        count = 0
+        for chat_id, messages in sess.execute(chats):
+            if chat_ids and count + messages > limit:
+                break
+            chat_ids.append(chat_id)
+            count += messages
+        if not chat_ids:
+            return []
 
+        # Busy chats are checked again, chat could be claimed meanwhile
+        sess.execute(
+            outbox.update()
+            .where(sa.and_(claimable, outbox.c.chat_id.in_(chat_ids)))
+            .values(lease_owner=owner, lease_until=lease_until)
+        )
+        rows = (
+            sess.query(
+                OutboxMessage.id,
+                OutboxMessage.chat_id,
+                OutboxMessage.text,
+                OutboxMessage.options,
+            )
+            .filter(
+                OutboxMessage.lease_owner == owner,
+                OutboxMessage.lease_until == lease_until,
+            )
+            .order_by(OutboxMessage.id)
+        )
+        return [
+            (message_id, chat_id, text, json.loads(options or "{}"))
+            for message_id, chat_id, text, options in rows
+            if message_id not in exclude
+        ]
 
-def export_csv():
-    """Exporting database to csv
 
-    Yields:
-        TextIOWrapper: File data
+def outbox_done(message_id, delivered=True):
+    """Mark message delivered or count failed delivery attempt
+
+    Args:
+        message_id (int): Outbox message id
+        delivered (bool): Message delivered or should not be sent anymore
+    """
+    with session() as sess:
+        query = sess.query(OutboxMessage).filter(OutboxMessage.id == message_id)
+        if delivered:
+            query.update(
+                {OutboxMessage.delivered_at: datetime.utcnow()},
+                synchronize_session=False,
+            )
+        else:
+            query.update(
+                {
+                    OutboxMessage.attempts: OutboxMessage.attempts + 1,
+                    OutboxMessage.lease_owner: None,
+                    OutboxMessage.lease_until: None,
+                },
+                synchronize_session=False,
+            )
+
+
+def outbox_cleanup(before):
+    """Delete delivered messages
+
+    Args:
+        before (datetime.datetime): Delete messages delivered before this time
+
+    Returns:
+        int: Deleted messages count
     """
     with session() as sess:
-        for table in DUMP_TABLES:
-            filename = f'{table.__tablename__}.csv'
-
-            with open(filename, 'w', newline='') as csv_file:
-                writer = csv.writer(csv_file, delimiter=';')
-                columns = [column.name for column in table.__mapper__.columns]
-                writer.writerow(columns)
-                for row in sess.query(table):
-                    writer.writerow([getattr(row, column) for column in columns])
-
-            with open(filename, 'rb') as csv_file:
-                yield csv_file
+        return (
+            sess.query(OutboxMessage)
+            .filter(OutboxMessage.delivered_at < before)
+            .delete(synchronize_session=False)
+        )
@@ -1,6 +1,7 @@
 import os
 import typing
 import logging
+import threading
 from contextlib import contextmanager
 
 import sqlalchemy as sa
@@ -11,7 +12,73 @@ logger = logging.getLogger(__name__)
 
 db_url = os.environ.get("DB_URL", "sqlite:///db.sqlite")
 
-engine = sa.create_engine(db_url)
+
+def _env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ("1", "true", "yes")
+
+
+def create_engine(url):
+    """Create engine tuned for multi-threaded access
+
+    SQLite file databases use WAL journal, so readers do not block
+    writer, with pooled connections configured by pragmas:
+        `DB_SQLITE_BUSY_TIMEOUT` - ms to wait for locked database (5000)
+        `DB_SQLITE_SYNCHRONOUS` - synchronous mode (NORMAL)
+        `DB_SQLITE_CACHE_SIZE` - page cache size in KiB (65536)
+        `DB_SQLITE_MMAP_SIZE` - memory mapped bytes (268435456)
+
+    Other databases use connections pool configured by:
+        `DB_POOL_SIZE` - connections to keep open (5)
+        `DB_MAX_OVERFLOW` - connections to open above pool size (10)
+        `DB_POOL_PRE_PING` - test connections before use (true)
+        `DB_POOL_RECYCLE` - seconds to reconnect after (1800)
+
+    Args:
+        url (str): Database url
+
+    Returns:
+        sqlalchemy.engine.Engine: Database engine
+    """
+    url = sa.engine.url.make_url(url)
+    if url.get_backend_name() != "sqlite":
+        return sa.create_engine(
+            url,
+            pool_size=int(os.environ.get("DB_POOL_SIZE", 5)),
+            max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+            pool_pre_ping=_env_bool("DB_POOL_PRE_PING", True),
+            pool_recycle=int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        )
+
+    if not url.database or url.database == ":memory:":
+        return sa.create_engine(url)
+
+    busy_timeout = int(os.environ.get("DB_SQLITE_BUSY_TIMEOUT", 5000))
+    pragmas = {
+        "journal_mode": "WAL",
+        "synchronous": os.environ.get("DB_SQLITE_SYNCHRONOUS", "NORMAL"),
+        "cache_size": -int(os.environ.get("DB_SQLITE_CACHE_SIZE", 64 * 1024)),
+        "mmap_size": int(os.environ.get("DB_SQLITE_MMAP_SIZE", 256 * 1024 ** 2)),
+        "busy_timeout": busy_timeout,
+    }
+    sqlite_engine = sa.create_engine(
+        url,
+        poolclass=sa.pool.QueuePool,
+        pool_size=int(os.environ.get("DB_POOL_SIZE", 5)),
+        max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+        connect_args={"timeout": busy_timeout / 1000, "check_same_thread": False},
+    )
+
+    @sa.event.listens_for(sqlite_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+    return sqlite_engine
+
+
+engine = create_engine(db_url)
 metadata = sa.MetaData(bind=engine)
 
 Session = scoped_session(sessionmaker(bind=engine))
@@ -55,3 +122,26 @@ def session(**kwargs) -> typing.ContextManager[Session]:
         raise
     finally:
         new_session.close()
+
+
+@contextmanager
+def count_queries() -> typing.ContextManager[typing.List[str]]:
+    """Collect sql statements executed by current thread
+
+    Example:
+        with count_queries() as statements:
+            get_user_subreddits_titles(chat_id)
+        assert len(statements) == 1
+    """
+    statements = []
+    thread_id = threading.get_ident()
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        if threading.get_ident() == thread_id:
+            statements.append(statement)
+
+    sa.event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", before_cursor_execute)
@@ -0,0 +1,381 @@
+import io
+import re
+import csv
+import gzip
+import json
+import zipfile
+import logging
+import tempfile
+from datetime import datetime
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+
+from .base import engine, session
+from .schema import User, Subreddit, Subscription, Tombstone, Backup
+
+logger = logging.getLogger(__name__)
+
+DUMP_FILE_NAME = "db.jsonl.gz"
+DELTA_FILE_NAME = "db.{created_at:%Y%m%d%H%M%S}.delta.jsonl.gz"
+DUMP_FILE_PATTERN = re.compile(r"^db(\.\d{14}\.delta)?\.jsonl\.gz$")
+DUMP_FORMAT = "redditbot-dump"
+DUMP_VERSION = 2
+DUMP_TABLES = (User, Subreddit, Subscription)
+DUMP_BATCH_SIZE = 1000
+EXPORT_FILE_NAME = "export.zip"
+# Dumps larger than this are spooled to temporary directory
+SPOOL_MAX_SIZE = 16 * 1024 ** 2
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _decode_row(table, columns, values):
+    row = {}
+    for name, value in zip(columns, values):
+        column = table.columns.get(name)
+        if column is None:
+            continue
+        if value is not None and isinstance(column.type, sa.DateTime):
+            value = datetime.fromisoformat(value)
+        row[name] = value
+    return row
+
+
+def _write_line(gz_file, data):
+    gz_file.write(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+    gz_file.write(b"\n")
+
+
+def _dump_deleted(conn, gz_file, table, since, batch_size):
+    """Write ids of table rows deleted since time
+
+    Returns:
+        int: Deleted rows count
+    """
+    tablename = table.__tablename__
+    result = conn.execute(
+        sa.select([Tombstone.row_id])
+        .where(
+            sa.and_(Tombstone.tablename == tablename, Tombstone.deleted_at >= since)
+        )
+        .order_by(Tombstone.id)
+    )
+    count = 0
+    while True:
+        rows = result.fetchmany(batch_size)
+        if not rows:
+            return count
+        _write_line(
+            gz_file, {"table": tablename, "deleted": [row_id for row_id, in rows]}
+        )
+        count += len(rows)
+
+
+def _dump_rows(conn, gz_file, table, since, batch_size, progress):
+    """Write table rows, only updated since time if given
+
+    Returns:
+        int: Dumped rows count
+    """
+    tablename = table.__tablename__
+    query = table.__table__.select().order_by(*table.__table__.primary_key.columns)
+    if since is not None:
+        query = query.where(table.updated_at >= since)
+    result = conn.execution_options(stream_results=True).execute(query)
+    count = 0
+    while True:
+        rows = result.fetchmany(batch_size)
+        if not rows:
+            return count
+        _write_line(
+            gz_file,
+            {
+                "table": tablename,
+                "rows": [[_encode_value(value) for value in row] for row in rows],
+            },
+        )
+        count += len(rows)
+        if progress:
+            progress(tablename, count)
+
+
+@contextmanager
+def create_dump(progress=None, batch_size=DUMP_BATCH_SIZE, since=None):
+    """Create database dump
+
+    Dump is gzip compressed json lines: header with tables columns,
+    then batches of rows. Rows are streamed from database in batches,
+    so memory usage does not depend on database size.
+
+    Delta dump contains only rows updated since previous backup
+    and ids of rows deleted since then, deleted ids go first.
+
+    Args:
+        progress (Callable[[str, int], None]): Called with table name and
+            dumped rows count after each batch
+        batch_size (int): Rows per batch
+        since (datetime.datetime): Create delta dump of changes since this time
+
+    Yields:
+        tempfile.SpooledTemporaryFile: Dump file with attributes:
+            `counts` - dumped rows count by table name,
+            `deleted` - dumped deleted rows count by table name,
+            `since` - delta start time, None for full dump,
+            `created_at` - changes after this time are not guaranteed in dump,
+            `file_name` - file name to send dump with
+    """
+    # Taken before reading, so next delta overlaps concurrent changes
+    created_at = datetime.utcnow()
+    counts = {}
+    deleted = {}
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as dump_file:
+        with gzip.GzipFile(fileobj=dump_file, mode="wb") as gz_file:
+            with engine.connect() as conn:
+                _write_line(
+                    gz_file,
+                    {
+                        "format": DUMP_FORMAT,
+                        "version": DUMP_VERSION,
+                        "created_at": created_at.isoformat(),
+                        "since": _encode_value(since),
+                        "tables": {
+                            table.__tablename__: [
+                                column.name for column in table.__table__.columns
+                            ]
+                            for table in DUMP_TABLES
+                        },
+                    },
+                )
+                if since is not None:
+                    for table in reversed(DUMP_TABLES):
+                        deleted[table.__tablename__] = _dump_deleted(
+                            conn, gz_file, table, since, batch_size
+                        )
+                for table in DUMP_TABLES:
+                    counts[table.__tablename__] = _dump_rows(
+                        conn, gz_file, table, since, batch_size, progress
+                    )
+
+        dump_file.seek(0)
+        dump_file.counts = counts
+        dump_file.deleted = deleted
+        dump_file.since = since
+        dump_file.created_at = created_at
+        if since is None:
+            dump_file.file_name = DUMP_FILE_NAME
+        else:
+            dump_file.file_name = DELTA_FILE_NAME.format(created_at=created_at)
+        logger.info(f"Created dump since {since}: {counts}, deleted: {deleted}")
+        yield dump_file
+
+
+def _upsert(conn, table, rows):
+    """Insert new rows and update existed rows by primary key
+
+    Args:
+        conn (sqlalchemy.engine.Connection): Database connection
+        table (sqlalchemy.Table): Table
+        rows (List[Dict]): Rows data
+    """
+    pk = list(table.primary_key.columns)[0]
+    existed = {
+        row_id
+        for row_id, in conn.execute(
+            sa.select([pk]).where(pk.in_([row[pk.name] for row in rows]))
+        )
+    }
+    new_rows = [row for row in rows if row[pk.name] not in existed]
+    if new_rows:
+        conn.execute(table.insert(), new_rows)
+
+    updated_rows = [
+        {f"_{name}": value for name, value in row.items()}
+        for row in rows
+        if row[pk.name] in existed
+    ]
+    if updated_rows:
+        columns = [name for name in updated_rows[0] if name != f"_{pk.name}"]
+        conn.execute(
+            table.update()
+            .where(pk == sa.bindparam(f"_{pk.name}"))
+            .values({name[1:]: sa.bindparam(name) for name in columns}),
+            updated_rows,
+        )
+
+
+def restore_dump(dump_file, progress=None):
+    """Restore database from dump in one transaction
+
+    Rows are upserted by primary key in batches as they are read,
+    rows deleted in delta dump are deleted. Full dump should be restored
+    first, then delta dumps in creation order.
+
+    Args:
+        dump_file (BinaryIO): Dump file object
+        progress (Callable[[str, int], None]): Called with table name and
+            restored rows count after each batch
+
+    Returns:
+        Dict[str, int]: Restored rows count by table name
+
+    Raises:
+        ValueError: if file is not database dump or its rows conflict
+            with existing rows
+    """
+    tables = {table.__tablename__: table.__table__ for table in DUMP_TABLES}
+    counts = {}
+    with gzip.GzipFile(fileobj=dump_file, mode="rb") as gz_file:
+        try:
+            header = json.loads(gz_file.readline())
+        except (OSError, EOFError, ValueError) as err:
+            raise ValueError(f"Bad dump file: {err}") from err
+        if not isinstance(header, dict) or header.get("format") != DUMP_FORMAT:
+            raise ValueError("Bad dump file: unknown format")
+
+        try:
+            with engine.begin() as conn:
+                for line in gz_file:
+                    batch = json.loads(line)
+                    tablename = batch["table"]
+                    if tablename not in tables:
+                        raise ValueError(f"Bad dump file: unknown table {tablename}")
+                    table = tables[tablename]
+
+                    if "deleted" in batch:
+                        pk = list(table.primary_key.columns)[0]
+                        conn.execute(table.delete().where(pk.in_(batch["deleted"])))
+                        continue
+
+                    columns = header["tables"][tablename]
+                    rows = [
+                        _decode_row(table, columns, values) for values in batch["rows"]
+                    ]
+                    _upsert(conn, table, rows)
+
+                    counts[tablename] = counts.get(tablename, 0) + len(rows)
+                    if progress:
+                        progress(tablename, counts[tablename])
+        except ValueError:
+            raise
+        except (OSError, EOFError, KeyError, IndexError, TypeError) as err:
+            # Truncated gzip or batch without expected fields, transaction
+            # is rolled back
+            raise ValueError(f"Bad dump file: {err!r}") from err
+        except sa.exc.SQLAlchemyError as err:
+            # Rows conflict with existing data, e.g. same subreddit title
+            # under another id, transaction is rolled back
+            reason = getattr(err, "orig", None) or err
+            raise ValueError(f"Dump conflicts with database: {reason}") from err
+
+    logger.info(f"Restored dump since {header.get('since')}: {counts}")
+    return counts
+
+
+def get_backup_since(full_interval):
+    """Get start time of next incremental backup
+
+    Args:
+        full_interval (datetime.timedelta): Max time between full backups
+
+    Returns:
+        datetime.datetime | None: Previous backup time, None if full backup
+            is required
+    """
+    with session() as sess:
+        last_full = (
+            sess.query(sa.func.max(Backup.created_at)).filter(Backup.full).scalar()
+        )
+        if last_full is None or last_full <= datetime.utcnow() - full_interval:
+            return None
+        return sess.query(sa.func.max(Backup.created_at)).scalar()
+
+
+def backup_done(dump_file):
+    """Save delivered backup, next delta starts from it
+
+    Tombstones older than full backup are not needed anymore.
+
+    Args:
+        dump_file (tempfile.SpooledTemporaryFile): Dump created by `create_dump`
+    """
+    full = dump_file.since is None
+    with session() as sess:
+        sess.add(
+            Backup(full=full, since=dump_file.since, created_at=dump_file.created_at)
+        )
+        if full:
+            sess.query(Tombstone).filter(
+                Tombstone.deleted_at < dump_file.created_at
+            ).delete(synchronize_session=False)
+
+
+@contextmanager
+def export_csv(tablenames=None, columns=None, since=None, batch_size=DUMP_BATCH_SIZE):
+    """Export database tables to csv files in one zip archive
+
+    Rows are streamed from database in batches and compressed on the fly,
+    archive is spooled to temporary file when it gets large.
+
+    Args:
+        tablenames (Collection[str]): Tables to export, default all dump tables
+        columns (Collection[str]): Columns to export, only existing in table
+            columns are exported, default all columns
+        since (datetime.datetime): Export only rows updated since this time
+        batch_size (int): Rows loaded per batch
+
+    Yields:
+        tempfile.SpooledTemporaryFile: Zip file with attributes:
+            `counts` - exported rows count by table name,
+            `file_name` - file name to send archive with
+
+    Raises:
+        ValueError: if unknown table or no column to export
+    """
+    tables = {table.__tablename__: table for table in DUMP_TABLES}
+    unknown = set(tablenames or ()) - set(tables)
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(sorted(unknown))}")
+    tables_columns = []
+    for tablename, table in tables.items():
+        if tablenames and tablename not in tablenames:
+            continue
+        table_columns = [
+            column
+            for column in table.__table__.columns
+            if not columns or column.name in columns
+        ]
+        if not table_columns:
+            raise ValueError(f"No columns to export from {tablename}")
+        tables_columns.append((table, table_columns))
+
+    counts = {}
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as zip_file:
+        with zipfile.ZipFile(zip_file, "w", zipfile.ZIP_DEFLATED) as archive:
+            with session() as sess:
+                for table, table_columns in tables_columns:
+                    tablename = table.__tablename__
+                    query = sess.query(*table_columns).order_by(
+                        *table.__table__.primary_key.columns
+                    )
+                    if since is not None:
+                        query = query.filter(table.updated_at >= since)
+
+                    counts[tablename] = 0
+                    with archive.open(f"{tablename}.csv", "w") as entry:
+                        with io.TextIOWrapper(entry, "utf-8", newline="") as csv_file:
+                            writer = csv.writer(csv_file, delimiter=";")
+                            writer.writerow([column.name for column in table_columns])
+                            for row in query.yield_per(batch_size):
+                                writer.writerow(row)
+                                counts[tablename] += 1
+
+        zip_file.seek(0)
+        zip_file.counts = counts
+        zip_file.file_name = EXPORT_FILE_NAME
+        logger.info(f"Exported csv since {since}: {counts}")
+        yield zip_file
@@ -0,0 +1,102 @@
+import logging
+
+import sqlalchemy as sa
+
+from .base import metadata
+
+logger = logging.getLogger(__name__)
+
+
+def _merge_duplicate_subreddits(conn):
+    """Move subscriptions to the first subreddit with same title"""
+    subreddits = metadata.tables["subreddits"]
+    subscriptions = metadata.tables["subscriptions"]
+    duplicates = conn.execute(
+        sa.select([subreddits.c.title, sa.func.min(subreddits.c.id)])
+        .group_by(subreddits.c.title)
+        .having(sa.func.count() > 1)
+    ).fetchall()
+    for title, keep_id in duplicates:
+        duplicate_ids = sa.select([subreddits.c.id]).where(
+            sa.and_(subreddits.c.title == title, subreddits.c.id != keep_id)
+        )
+        conn.execute(
+            subscriptions.update()
+            .where(subscriptions.c.subreddit_id.in_(duplicate_ids))
+            .values(subreddit_id=keep_id)
+        )
+        conn.execute(
+            subreddits.delete().where(
+                sa.and_(subreddits.c.title == title, subreddits.c.id != keep_id)
+            )
+        )
+        logger.warning(f"Merged duplicate subreddits {title!r} into {keep_id}")
+
+
+def _delete_duplicate_subscriptions(conn):
+    """Keep the first subscription of user to subreddit"""
+    subscriptions = metadata.tables["subscriptions"]
+    first_ids = (
+        sa.select([sa.func.min(subscriptions.c.id).label("id")])
+        .group_by(subscriptions.c.user_id, subscriptions.c.subreddit_id)
+        .alias("first_ids")
+    )
+    result = conn.execute(
+        subscriptions.delete().where(
+            ~subscriptions.c.id.in_(sa.select([first_ids.c.id]))
+        )
+    )
+    if result.rowcount:
+        logger.warning(f"Deleted {result.rowcount} duplicate subscriptions")
+
+
+# Data fixes required before creating unique index
+_BEFORE_UNIQUE_INDEX = {
+    "subreddits": _merge_duplicate_subreddits,
+    "subscriptions": _delete_duplicate_subscriptions,
+}
+
+
+def upgrade(engine):
+    """Upgrade existing database to declared schema in place
+
+    Adds missing nullable columns and missing indexes, duplicated rows
+    are merged before creating unique indexes. New tables should be
+    created with `metadata.create_all()` before upgrade.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): Database engine
+    """
+    inspector = sa.inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    tables = [
+        table for table in metadata.sorted_tables if table.name in existing_tables
+    ]
+    with engine.begin() as conn:
+        # Data fixes update rows through declared tables, so every table
+        # needs its declared columns, e.g. `updated_at` set on update,
+        # before any of them runs
+        for table in tables:
+            existing_columns = {
+                column["name"] for column in inspector.get_columns(table.name)
+            }
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(
+                        f"ALTER TABLE {table.name} "
+                        f"ADD COLUMN {column.name} {column_type}"
+                    )
+                    logger.info(f"Added column {table.name}.{column.name}")
+
+        for table in tables:
+            existing_indexes = {
+                index["name"] for index in inspector.get_indexes(table.name)
+            }
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name in existing_indexes:
+                    continue
+                if index.unique and table.name in _BEFORE_UNIQUE_INDEX:
+                    _BEFORE_UNIQUE_INDEX[table.name](conn)
+                index.create(conn)
+                logger.info(f"Created index {index.name}")
@@ -1,9 +1,11 @@
 import logging
+from datetime import datetime
 
 import sqlalchemy as sa
 from sqlalchemy.orm import relationship, backref
 
-from .base import Base, session
+from .base import Base, session, engine
+from .migrations import upgrade
 
 
 logger = logging.getLogger(__name__)
@@ -15,7 +17,23 @@ class User(Base):
     id = sa.Column(sa.Integer, primary_key=True)
     first_name = sa.Column(sa.String, default="Anonymous")
     last_name = sa.Column(sa.String)
-    utc_offset_min = sa.Column(sa.Integer, default=0)
+    utc_offset_min = sa.Column(sa.Integer, default=0, index=True)
+    # IANA timezone id, fixed utc_offset_min is used if not set
+    timezone = sa.Column(sa.String(64))
+    # Local news time in minutes, bot default if not set
+    news_time_min = sa.Column(sa.Integer)
+    # hourly, daily or weekly, daily if not set
+    news_cadence = sa.Column(sa.String(16))
+    # Day of week for weekly news, Monday is 0
+    news_weekday = sa.Column(sa.Integer)
+    # Not scheduled yet if not set
+    next_delivery_utc = sa.Column(sa.DateTime, index=True)
+    # Worker delivering news to user until lease time, see `db.claim_due_users`
+    lease_owner = sa.Column(sa.String(64))
+    lease_until = sa.Column(sa.DateTime)
+    updated_at = sa.Column(
+        sa.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True
+    )
 
     subreddits = relationship("Subreddit", secondary="subscriptions")
 
@@ -73,7 +91,10 @@ class Subreddit(Base):
     __tablename__ = "subreddits"
 
     id = sa.Column(sa.Integer, primary_key=True)
-    title = sa.Column(sa.String(255))
+    title = sa.Column(sa.String(255), index=True, unique=True)
+    updated_at = sa.Column(
+        sa.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True
+    )
 
     users = relationship("User", secondary="subscriptions")
 
@@ -123,9 +144,21 @@ class Subreddit(Base):
 
 class Subscription(Base):
     __tablename__ = "subscriptions"
+    # Unique index also serves lookups by user_id
+    __table_args__ = (
+        sa.Index(
+            "ix_subscriptions_user_id_subreddit_id",
+            "user_id",
+            "subreddit_id",
+            unique=True,
+        ),
+    )
     id = sa.Column(sa.Integer, primary_key=True)
     user_id = sa.Column(sa.Integer, sa.ForeignKey("users.id"))
-    subreddit_id = sa.Column(sa.Integer, sa.ForeignKey("subreddits.id"))
+    subreddit_id = sa.Column(sa.Integer, sa.ForeignKey("subreddits.id"), index=True)
+    updated_at = sa.Column(
+        sa.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True
+    )
 
     user = relationship(
         User, backref=backref("subscriptions", cascade="all, delete-orphan")
@@ -148,13 +181,106 @@ class Subscription(Base):
         Returns:
             db.Subscription: Subscription instance
         """
-        subreddit = Subreddit.get(subreddit_title)
-        if subreddit:
-            return (
-                cls.query()
-                .filter(cls.user_id == chat_id, cls.subreddit_id == subreddit.id)
-                .one_or_none()
-            )
+        return (
+            cls.query()
+            .join(Subreddit, Subreddit.id == cls.subreddit_id)
+            .filter(cls.user_id == chat_id, Subreddit.title == subreddit_title)
+            .one_or_none()
+        )
+
+
+class OutboxMessage(Base):
+    __tablename__ = "outbox"
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    key = sa.Column(sa.String(255), unique=True, nullable=False)
+    chat_id = sa.Column(sa.Integer, nullable=False, index=True)
+    text = sa.Column(sa.Text, nullable=False)
+    options = sa.Column(sa.Text, default="{}")
+    attempts = sa.Column(sa.Integer, default=0)
+    created_at = sa.Column(sa.DateTime, default=datetime.utcnow)
+    delivered_at = sa.Column(sa.DateTime, index=True)
+    # Worker sending message until lease time, see `db.outbox_pending`
+    lease_owner = sa.Column(sa.String(64))
+    lease_until = sa.Column(sa.DateTime)
+
+    def __init__(self, key, chat_id, text, options="{}"):
+        """Message waiting for delivery
+
+        Args:
+            key (str): Unique message key to prevent duplicates
+            chat_id (int): Telegram chat id
+            text (str): Message text
+            options (str): Json encoded send_message kwargs
+        """
+        self.key = key
+        self.chat_id = chat_id
+        self.text = text
+        self.options = options
+
+    def __repr__(self):
+        return f"<OutboxMessage({self.id}, {self.key}, {self.chat_id})>"
+
+
+class GeohashTimezone(Base):
+    __tablename__ = "geohash_timezones"
+
+    geohash = sa.Column(sa.String(12), primary_key=True)
+    timezone = sa.Column(sa.String(64), nullable=False)
+    created_at = sa.Column(sa.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<GeohashTimezone({self.geohash}, {self.timezone})>"
+
+
+class Tombstone(Base):
+    __tablename__ = "tombstones"
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    tablename = sa.Column(sa.String(255), nullable=False)
+    row_id = sa.Column(sa.Integer, nullable=False)
+    deleted_at = sa.Column(sa.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<Tombstone({self.id}, {self.tablename}, {self.row_id})>"
+
+    @classmethod
+    def record(cls, conn, tablename, row_ids):
+        """Record deleted rows for incremental backup
+
+        Bulk deletes do not emit ORM events and must record deleted rows
+        explicitly in the same transaction.
+
+        Args:
+            conn (sqlalchemy.engine.Connection | sqlalchemy.orm.Session):
+                Connection of deleting transaction
+            tablename (str): Table name
+            row_ids (Iterable[int]): Deleted rows ids
+        """
+        rows = [{"tablename": tablename, "row_id": row_id} for row_id in row_ids]
+        if rows:
+            conn.execute(cls.__table__.insert(), rows)
+
+
+class Backup(Base):
+    __tablename__ = "backups"
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    full = sa.Column(sa.Boolean, default=False, nullable=False)
+    since = sa.Column(sa.DateTime)
+    created_at = sa.Column(sa.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<Backup({self.id}, {self.full}, {self.since}, {self.created_at})>"
+
+
+@sa.event.listens_for(User, "after_delete")
+@sa.event.listens_for(Subreddit, "after_delete")
+@sa.event.listens_for(Subscription, "after_delete")
+def record_tombstone(mapper, connection, target):
+    """Record rows deleted by session, including cascades"""
+    Tombstone.record(connection, target.__tablename__, [target.id])
 
 
 Base.metadata.create_all()
+upgrade(engine)
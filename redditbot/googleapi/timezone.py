@@ -1,5 +1,14 @@
-import requests
 import time
+import asyncio
+
+import requests
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from timezones import TimeZoneError
 
 
 class TimeZoneAPI:
@@ -10,13 +19,42 @@ class TimeZoneAPI:
 
     Args:
         api_key (str): Google api key
+        timeout (int | float): Request timeout in seconds
+        session (requests.Session): Session to reuse connections
     """
     _BASE_URL = 'https://maps.googleapis.com/maps/api/timezone/json'
 
-    def __init__(self, api_key):
+    def __init__(self, api_key, timeout=5, session=None):
         if not api_key:
             raise ValueError("TimeZoneAPI required api_key argument")
         self._api_key = api_key
+        self.timeout = timeout
+        self._session = session or requests.Session()
+        self._async_session = None
+
+    def _get_params(self, latitude, longitude):
+        return {
+            'location': f'{latitude},{longitude}',
+            'timestamp': time.time(),
+            'key': self._api_key,
+        }
+
+    @staticmethod
+    def _check_response(data):
+        if not isinstance(data, dict):
+            raise ValueError(f"expected object, got {type(data).__name__}")
+        return data
+
+    @staticmethod
+    def _get_timezone_id(data):
+        if data.get("status") != "OK":
+            raise TimeZoneError(
+                f"Error response from api: {data.get('status')}: "
+                f"{data.get('errorMessage', '')}"
+            )
+        if not data.get("timeZoneId"):
+            raise TimeZoneError("Response without timeZoneId")
+        return data["timeZoneId"]
 
     def get_timezone(self, latitude, longitude):
         """Get timezone info by latitude and longitude
@@ -28,21 +66,82 @@ class TimeZoneAPI:
         Returns:
             Dict: Timezone data
         """
-        params = {
-            'location': f'{latitude},{longitude}',
-            'timestamp': time.time(),
-            'key': self._api_key,
-        }
+        params = self._get_params(latitude, longitude)
+        try:
+            response = self._session.get(
+                self._BASE_URL, params=params, timeout=self.timeout
+            )
+        except requests.RequestException as err:
+            return {"status": "REQUEST_ERROR", "errorMessage": str(err)}
 
-        response = requests.get(self._BASE_URL, params=params)
-        if response.status_code == 200:
-            data = response.json()
-        else:
-            data = {
-                "status": response.status_code,
-                "errorMessage": response.reason,
-            }
+        if response.status_code != 200:
+            return {"status": response.status_code, "errorMessage": response.reason}
+        try:
+            return self._check_response(response.json())
+        except ValueError as err:
+            return {"status": "REQUEST_ERROR", "errorMessage": f"Bad response: {err}"}
 
-        return data
+    def get_timezone_id(self, latitude, longitude):
+        """Get timezone id by latitude and longitude
 
+        Args:
+            latitude (int | float): Latitude
+            longitude (int | float): longitude
+
+        Returns:
+            str: IANA timezone id
+
+        Raises:
+            timezones.TimeZoneError: if api request failed
+        """
+        return self._get_timezone_id(self.get_timezone(latitude, longitude))
+
+    async def get_timezone_async(self, latitude, longitude):
+        """Get timezone info by latitude and longitude with asyncio
+
+        Requires optional `aiohttp` package.
+
+        Args:
+            latitude (int | float): Latitude
+            longitude (int | float): longitude
+
+        Returns:
+            Dict: Timezone data
+        """
+        if self._async_session is None or self._async_session.closed:
+            self._async_session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+
+        session = self._async_session
+        params = self._get_params(latitude, longitude)
+        try:
+            async with session.get(self._BASE_URL, params=params) as response:
+                if response.status != 200:
+                    return {"status": response.status, "errorMessage": response.reason}
+                return self._check_response(await response.json(content_type=None))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            return {"status": "REQUEST_ERROR", "errorMessage": str(err)}
+        except ValueError as err:
+            return {"status": "REQUEST_ERROR", "errorMessage": f"Bad response: {err}"}
+
+    async def get_timezone_id_async(self, latitude, longitude):
+        """Get timezone id by latitude and longitude with asyncio
+
+        Args:
+            latitude (int | float): Latitude
+            longitude (int | float): longitude
+
+        Returns:
+            str: IANA timezone id
+
+        Raises:
+            timezones.TimeZoneError: if api request failed
+        """
+        data = await self.get_timezone_async(latitude, longitude)
+        return self._get_timezone_id(data)
 
+    async def close_async(self):
+        """Close asyncio session"""
+        if self._async_session is not None:
+            await self._async_session.close()
@@ -1,2 +1,6 @@
-from .reddit import Reddit
+from .reddit import Reddit, RedditError
+from .aio import AsyncReddit
+from .cache import ListingCache
+from .models import Listing, Post
+from .ratelimit import TokenBucket, PRIORITY_HIGH, PRIORITY_LOW
 from . import limits
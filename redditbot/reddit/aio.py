@@ -0,0 +1,253 @@
+import random
+import asyncio
+import logging
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from . import limits
+from .cache import ListingCache
+from .models import Listing, loads
+from .reddit import Reddit, RedditError
+from .ratelimit import TokenBucket, PRIORITY_HIGH
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncReddit:
+    """Asyncio reddit api client
+
+    Has the same methods as `reddit.Reddit` as coroutines, requires
+    optional `aiohttp` package. Cache and rate limiter can be shared
+    with threaded client, so both use one budget and one cache.
+
+    Args:
+        cache (reddit.cache.ListingCache): Listings cache, pass False to disable
+        limiter (reddit.ratelimit.TokenBucket): Rate limiter
+        pool_size (int): Max keep-alive connections and concurrent requests to reddit
+        connect_timeout (int | float): Seconds to wait for connection
+        read_timeout (int | float): Seconds to wait for response
+        retries (int): Max retries on connection errors, 429 and 5xx responses
+        backoff_factor (float): Retries backoff factor
+        rate_limit (int | float): Max requests per second to reddit, if no limiter
+        rate_burst (int): Max requests burst to reddit, if no limiter
+
+    Raises:
+        RuntimeError: if `aiohttp` is not installed
+    """
+    _BASE_URL = Reddit._BASE_URL
+    _HEADERS = Reddit._HEADERS
+    _RETRY_STATUSES = Reddit._RETRY_STATUSES
+    _NOT_FOUND_STATUSES = Reddit._NOT_FOUND_STATUSES
+    has_posts = staticmethod(Reddit.has_posts)
+    parse_listing = staticmethod(Reddit.parse_listing)
+    _check_argument = staticmethod(Reddit._check_argument)
+
+    def __init__(
+        self,
+        cache=None,
+        limiter=None,
+        pool_size=10,
+        connect_timeout=3.05,
+        read_timeout=10,
+        retries=3,
+        backoff_factor=0.5,
+        rate_limit=2,
+        rate_burst=5,
+    ):
+        if aiohttp is None:
+            raise RuntimeError("AsyncReddit requires aiohttp package")
+        if cache is None:
+            cache = ListingCache()
+        self.cache = cache if cache is not False else None
+        self.limiter = limiter or TokenBucket(rate=rate_limit, capacity=rate_burst)
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(
+            sock_connect=connect_timeout, sock_read=read_timeout
+        )
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self._session = None
+        self._semaphore = None
+        self._loading = {}
+
+    def _get_session(self):
+        # Session must be created inside running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers=self._HEADERS,
+                timeout=self.timeout,
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+            )
+        return self._session
+
+    def _get_semaphore(self):
+        # Semaphore must be created inside running event loop before python 3.10
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.pool_size)
+        return self._semaphore
+
+    async def close(self):
+        """Close pooled connections"""
+        if self._session is not None:
+            await self._session.close()
+
+    def _get_backoff(self, attempt, retry_after=None):
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            delay = self.backoff_factor * 2 ** attempt
+            return delay * random.uniform(0.5, 1.5)
+
+    async def get_json(self, url, params, priority=PRIORITY_HIGH):
+        """Get
+
+        Args:
+            url (str): Url for request
+            params (Dict): Get request params
+            priority (int): Request priority for rate limiter
+
+        Returns:
+            Dict: Response data
+
+        Raises:
+            RedditError: if request failed, dropped by rate limiter,
+                response status is not 200 or response is not json
+        """
+        if not await self.limiter.acquire_async(priority):
+            raise RedditError(None, "Request dropped by rate limiter", url)
+
+        session = self._get_session()
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            try:
+                async with session.get(
+                    url, params=params, allow_redirects=False
+                ) as response:
+                    self.limiter.update(response.headers)
+                    if response.status == 200:
+                        body = await response.read()
+                        try:
+                            return loads(body)
+                        except ValueError as err:
+                            reason = f"Invalid json: {err}"
+                            raise RedditError(
+                                response.status, reason, str(response.url)
+                            ) from err
+                    error = RedditError(
+                        response.status, response.reason, str(response.url)
+                    )
+                    retry_after = response.headers.get("Retry-After")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                error = RedditError(None, str(err) or type(err).__name__, url)
+
+            if error.status_code not in (None, *self._RETRY_STATUSES):
+                raise error
+            if attempt < self.retries:
+                await asyncio.sleep(self._get_backoff(attempt, retry_after))
+        raise error
+
+    async def _load_top_posts(self, subreddit, url, params, priority):
+        try:
+            data = await self.get_json(url, params, priority)
+            return self.parse_listing(data, url)
+        except RedditError as err:
+            if err.status_code in self._NOT_FOUND_STATUSES:
+                logger.info(f"Subreddit {subreddit} not available: {err}")
+                return Listing()
+            raise
+
+    async def _load_and_cache(self, key, subreddit, url, params, priority):
+        data = await self._load_top_posts(subreddit, url, params, priority)
+        self.cache.set(key, data, negative=not self.has_posts(data))
+        return data
+
+    async def get_subreddit_top_posts(
+        self, subreddit, sort="top", t="day", limit=5, priority=PRIORITY_HIGH
+    ):
+        """Get subreddit posts
+
+        Concurrent requests of not cached listing share one reddit request.
+
+        Args:
+            subreddit (str): Subreddit
+            sort (str): Sort key (one of "relevance", "hot", "top", "new", "comments")
+            t (str): Search period (one of "hour", "day", "week", "month", "year", "all")
+            limit (int): Posts limit (1 - 100)
+            priority (int): Request priority for rate limiter
+
+        Returns:
+            reddit.models.Listing: Subreddit posts, empty if subreddit not found
+
+        Raises:
+            RedditError: if reddit is not available
+        """
+        self._check_argument(sort, limits.sort)
+        self._check_argument(t, limits.t)
+        self._check_argument(limit, limits.limit)
+
+        url = f"{self._BASE_URL}{subreddit}/top.json"
+        # Titles and urls are not html escaped with raw_json
+        params = {"sort": sort, "t": t, "limit": limit, "raw_json": 1}
+        if self.cache is None:
+            return await self._load_top_posts(subreddit, url, params, priority)
+
+        key = self.cache.make_key(subreddit, sort, t, limit)
+        found, data = self.cache.get(key)
+        if found:
+            return data
+
+        loading = self._loading.get(key)
+        if loading is None:
+            loading = asyncio.ensure_future(
+                self._load_and_cache(key, subreddit, url, params, priority)
+            )
+            self._loading[key] = loading
+            loading.add_done_callback(lambda _: self._loading.pop(key, None))
+        # Cancelled caller does not cancel load shared with other callers
+        return await asyncio.shield(loading)
+
+    async def get_many_top_posts(
+        self, subreddits, sort="top", t="day", limit=5, priority=PRIORITY_HIGH
+    ):
+        """Get posts of many subreddits concurrently
+
+        Like threads pool of `reddit.Reddit`, at most `pool_size` listings
+        of all callers are loaded at once, other subreddits wait for them.
+
+        Args:
+            subreddits (Iterable[str]): Subreddits
+            sort (str): Sort key (one of "relevance", "hot", "top", "new", "comments")
+            t (str): Search period (one of "hour", "day", "week", "month", "year", "all")
+            limit (int): Posts limit (1 - 100)
+            priority (int): Request priority for rate limiter
+
+        Yields:
+            Tuple[str, reddit.models.Listing | None]: Subreddit and posts in
+                completion order, posts are None if request failed
+        """
+        semaphore = self._get_semaphore()
+
+        async def get(subreddit):
+            try:
+                async with semaphore:
+                    data = await self.get_subreddit_top_posts(
+                        subreddit, sort, t, limit, priority
+                    )
+            except RedditError:
+                logger.exception(f"Failed to get posts for subreddit {subreddit}")
+                data = None
+            return subreddit, data
+
+        tasks = [
+            asyncio.ensure_future(get(subreddit))
+            for subreddit in dict.fromkeys(subreddits)
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,129 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class ListingCache:
+    """Thread safe LRU cache with TTL for reddit listings
+
+    Empty listings (subreddit not found or has no posts) are cached
+    as negative entries with own ttl.
+
+    Args:
+        ttl (int | float): Seconds to keep listing
+        negative_ttl (int | float): Seconds to keep empty listing
+        maxsize (int): Maximum cached listings count
+    """
+
+    def __init__(self, ttl=600, negative_ttl=300, maxsize=1024):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return (
+            f"<ListingCache(size={len(self)}/{self.maxsize}, "
+            f"hits={self.hits}, misses={self.misses})>"
+        )
+
+    @staticmethod
+    def make_key(subreddit, sort, t, limit):
+        """Make cache key
+
+        Args:
+            subreddit (str): Subreddit
+            sort (str): Sort key
+            t (str): Search period
+            limit (int): Posts limit
+
+        Returns:
+            Tuple: Cache key
+        """
+        return subreddit.lower(), sort, t, limit
+
+    @property
+    def stats(self):
+        """Dict: Cache counters"""
+        return {"size": len(self), "hits": self.hits, "misses": self.misses}
+
+    def get(self, key):
+        """Get not expired value
+
+        Args:
+            key (Tuple): Cache key
+
+        Returns:
+            Tuple[bool, Any]: Found flag and cached value
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, negative=False):
+        """Set value
+
+        Args:
+            key (Tuple): Cache key
+            value (Any): Value to cache
+            negative (bool): Value is empty listing
+        """
+        ttl = self.negative_ttl if negative else self.ttl
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, key, loader, is_negative=lambda value: not value):
+        """Get cached value or load it once for all concurrent callers
+
+        Args:
+            key (Tuple): Cache key
+            loader (Callable[[], Any]): Function to load value on cache miss
+            is_negative (Callable[[Any], bool]): Check if value is empty
+
+        Returns:
+            Any: Cached or loaded value
+        """
+        found, value = self.get(key)
+        if found:
+            return value
+
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._data.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    # Loaded by concurrent caller
+                    return entry[1]
+            try:
+                value = loader()
+                self.set(key, value, negative=is_negative(value))
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+
+        return value
+
+    def clear(self):
+        """Remove all cached values"""
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,120 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(content):
+    """Parse json response body
+
+    Uses optional `orjson` package if it is installed.
+
+    Args:
+        content (bytes | str): Response body
+
+    Returns:
+        Any: Parsed data
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+class Post:
+    """Reddit post fields used by bot
+
+    Args:
+        name (str): Post fullname, e.g. `t3_abc`
+        title (str): Post title
+        url (str): Post link
+        score (int): Post score
+    """
+    __slots__ = ("name", "title", "url", "score")
+
+    def __init__(self, name, title, url, score):
+        self.name = name
+        self.title = title
+        self.url = url
+        self.score = score
+
+    def __repr__(self):
+        return f"<Post(name={self.name!r}, score={self.score})>"
+
+    @classmethod
+    def from_json(cls, data):
+        """Make post from listing child data
+
+        Args:
+            data (Dict): `data` of reddit listing child
+
+        Returns:
+            Post: Post
+        """
+        return cls(
+            data.get("name"),
+            data.get("title") or "",
+            data.get("url") or "",
+            data.get("score") or 0,
+        )
+
+
+class Listing:
+    """Subreddit posts parsed once from reddit listing
+
+    Keeps only posts fields used by bot instead of the whole response,
+    so cached listings take a fraction of memory. Empty listing is false.
+
+    Args:
+        posts (Iterable[Post]): Posts
+    """
+    __slots__ = ("posts",)
+
+    def __init__(self, posts=()):
+        self.posts = tuple(posts)
+
+    def __repr__(self):
+        return f"<Listing(posts={len(self.posts)})>"
+
+    def __len__(self):
+        return len(self.posts)
+
+    def __iter__(self):
+        return iter(self.posts)
+
+    @property
+    def version(self):
+        """Tuple: Posts ids and scores to detect changed posts"""
+        return tuple((post.name, post.score) for post in self.posts)
+
+    @classmethod
+    def from_json(cls, data):
+        """Make listing from reddit response data
+
+        Children other than posts, e.g. subreddits of search listing,
+        are skipped.
+
+        Args:
+            data (Dict): Reddit listing response data
+
+        Returns:
+            Listing: Listing, empty if response has no posts
+
+        Raises:
+            ValueError: if data is not a reddit listing
+        """
+        if not data:
+            return cls()
+        if not isinstance(data, dict) or not isinstance(data.get("data", {}), dict):
+            raise ValueError(f"Expected listing object, got {type(data).__name__}")
+        children = data.get("data", {}).get("children") or []
+        if not isinstance(children, list):
+            raise ValueError(f"Expected children list, got {type(children).__name__}")
+        return cls(
+            Post.from_json(item["data"])
+            for item in children
+            if isinstance(item, dict)
+            and item.get("kind") == "t3"
+            and isinstance(item.get("data"), dict)
+        )
@@ -0,0 +1,168 @@
+import time
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 0
+PRIORITY_LOW = 1
+
+
+class TokenBucket:
+    """Thread safe token bucket limiter for reddit requests
+
+    Rate adapts to `x-ratelimit-*` response headers: remaining budget
+    is spread evenly until the budget reset. High priority requests
+    (interactive commands) wait for a token, low priority requests
+    (background jobs) are shed when the budget runs low or high
+    priority requests are waiting.
+
+    For more information: https://github.com/reddit-archive/reddit/wiki/API
+
+    Args:
+        rate (int | float): Max tokens per second
+        capacity (int): Max burst size
+        low_priority_reserve (int): Budget left for high priority requests only
+        max_wait (int | float): Max seconds to wait for token
+    """
+
+    def __init__(self, rate=2, capacity=5, low_priority_reserve=10, max_wait=30):
+        self.max_rate = rate
+        self.capacity = capacity
+        self.low_priority_reserve = low_priority_reserve
+        self.max_wait = max_wait
+        self.rate = rate
+        self.shed = 0
+
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._remaining = None
+        self._reset_at = 0
+        self._high_waiting = 0
+        self._cond = threading.Condition()
+
+    def __repr__(self):
+        return (
+            f"<TokenBucket(rate={self.rate:.2f}, tokens={self._tokens:.2f}, "
+            f"remaining={self._remaining}, shed={self.shed})>"
+        )
+
+    def _refill(self, now):
+        if self._remaining is not None and now >= self._reset_at:
+            # Budget window is over, wait for new headers
+            self._remaining = None
+            self.rate = self.max_rate
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def _is_budget_low(self):
+        if self._remaining is None:
+            return False
+        return self._remaining < self.low_priority_reserve
+
+    def _take(self, priority, now):
+        """Take token if available
+
+        Returns:
+            float | None: 0 if token taken, seconds to wait for token,
+                None if request should be dropped
+        """
+        self._refill(now)
+        if priority != PRIORITY_HIGH and (self._high_waiting or self._is_budget_low()):
+            return None
+
+        if self._remaining is not None and self._remaining < 1:
+            return self._reset_at - now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            if self._remaining is not None:
+                self._remaining -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def acquire(self, priority=PRIORITY_HIGH, timeout=None):
+        """Take token, wait for it if required
+
+        Args:
+            priority (int): Request priority (PRIORITY_HIGH or PRIORITY_LOW)
+            timeout (int | float | None): Max seconds to wait, default max_wait
+
+        Returns:
+            bool: True if token acquired, False if request should be dropped
+        """
+        timeout = self.max_wait if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if priority == PRIORITY_HIGH:
+                self._high_waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._take(priority, now)
+                    if wait == 0:
+                        return True
+                    if wait is None or now + wait > deadline:
+                        self.shed += 1
+                        return False
+                    self._cond.wait(wait)
+            finally:
+                if priority == PRIORITY_HIGH:
+                    self._high_waiting -= 1
+                    self._cond.notify_all()
+
+    async def acquire_async(self, priority=PRIORITY_HIGH, timeout=None):
+        """Take token, sleep in event loop until it is available if required
+
+        Args:
+            priority (int): Request priority (PRIORITY_HIGH or PRIORITY_LOW)
+            timeout (int | float | None): Max seconds to wait, default max_wait
+
+        Returns:
+            bool: True if token acquired, False if request should be dropped
+        """
+        timeout = self.max_wait if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        if priority == PRIORITY_HIGH:
+            with self._cond:
+                self._high_waiting += 1
+        try:
+            while True:
+                now = time.monotonic()
+                with self._cond:
+                    wait = self._take(priority, now)
+                    if wait == 0:
+                        return True
+                    if wait is None or now + wait > deadline:
+                        self.shed += 1
+                        return False
+                await asyncio.sleep(wait)
+        finally:
+            if priority == PRIORITY_HIGH:
+                with self._cond:
+                    self._high_waiting -= 1
+                    self._cond.notify_all()
+
+    def update(self, headers):
+        """Adapt rate to reddit rate limit headers
+
+        Args:
+            headers (Mapping): Response headers
+        """
+        try:
+            remaining = float(headers["x-ratelimit-remaining"])
+            reset = float(headers["x-ratelimit-reset"])
+        except (KeyError, TypeError, ValueError):
+            return
+
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            self._remaining = remaining
+            self._reset_at = now + reset
+            if reset > 0:
+                self.rate = max(min(self.max_rate, remaining / reset), 1 / reset)
+            logger.debug(f"Reddit budget: {remaining} requests for {reset}s, {self}")
+            self._cond.notify_all()
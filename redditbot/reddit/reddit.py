@@ -1,35 +1,150 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from . import limits
+from .cache import ListingCache
+from .models import Listing, loads
+from .ratelimit import TokenBucket, PRIORITY_HIGH
+
+logger = logging.getLogger(__name__)
+
+
+class RedditError(Exception):
+    """Reddit api request failed
+
+    Args:
+        status_code (int | None): Response status code, None if no response
+        reason (str): Error reason
+        url (str): Request url
+    """
+
+    def __init__(self, status_code, reason, url):
+        super(RedditError, self).__init__(f"{status_code} {reason}: {url}")
+        self.status_code = status_code
+        self.reason = reason
+        self.url = url
 
 
 class Reddit:
     """Class to work with reddit api
 
     For more information: https://www.reddit.com/dev/api/
+
+    Args:
+        cache (reddit.cache.ListingCache): Listings cache, pass False to disable
+        pool_size (int): Max keep-alive connections and concurrent requests to reddit
+        connect_timeout (int | float): Seconds to wait for connection
+        read_timeout (int | float): Seconds to wait for response
+        retries (int): Max retries on connection errors, 429 and 5xx responses
+        backoff_factor (float): Retries backoff factor
+        rate_limit (int | float): Max requests per second to reddit
+        rate_burst (int): Max requests burst to reddit
     """
     _BASE_URL = "https://www.reddit.com/r/"
     _HEADERS = {"User-agent": "TopSubredditBot"}
-
-    def __init__(self):
-        pass
-
-    def get_json(self, url, params):
+    _RETRY_STATUSES = (429, 500, 502, 503, 504)
+    # Unknown subreddits are redirected to search, banned, private
+    # and quarantined subreddits are forbidden
+    _NOT_FOUND_STATUSES = (301, 302, 303, 307, 308, 403, 404, 451)
+
+    def __init__(
+        self,
+        cache=None,
+        pool_size=10,
+        connect_timeout=3.05,
+        read_timeout=10,
+        retries=3,
+        backoff_factor=0.5,
+        rate_limit=2,
+        rate_burst=5,
+    ):
+        if cache is None:
+            cache = ListingCache()
+        self.cache = cache if cache is not False else None
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=self._RETRY_STATUSES,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=retry
+        )
+        self._session = requests.Session()
+        self._session.headers.update(self._HEADERS)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix="reddit"
+        )
+        self.limiter = TokenBucket(rate=rate_limit, capacity=rate_burst)
+
+    def close(self):
+        """Close pooled connections and stop workers"""
+        self._executor.shutdown(wait=False)
+        self._session.close()
+
+    def get_json(self, url, params, priority=PRIORITY_HIGH):
         """Get
 
         Args:
             url (str): Url for request
             params (Dict): Get request params
+            priority (int): Request priority for rate limiter
 
         Returns:
             Dict: Response data
+
+        Raises:
+            RedditError: if request failed, dropped by rate limiter,
+                response status is not 200 or response is not json
         """
-        response = requests.get(url, headers=self._HEADERS, params=params)
-        if response.status_code == 200:
-            data = response.json()
-        else:
-            data = {}
-        return data
+        if not self.limiter.acquire(priority):
+            raise RedditError(None, "Request dropped by rate limiter", url)
+
+        try:
+            response = self._session.get(
+                url, params=params, timeout=self.timeout, allow_redirects=False
+            )
+        except requests.RequestException as err:
+            raise RedditError(None, str(err), url) from err
+
+        self.limiter.update(response.headers)
+
+        if response.status_code != 200:
+            raise RedditError(response.status_code, response.reason, response.url)
+        try:
+            return loads(response.content)
+        except ValueError as err:
+            raise RedditError(
+                response.status_code, f"Invalid json: {err}", response.url
+            ) from err
+
+    @staticmethod
+    def parse_listing(data, url):
+        """Parse listing response data
+
+        Args:
+            data (Dict): Reddit listing response data
+            url (str): Request url
+
+        Returns:
+            reddit.models.Listing: Subreddit posts
+
+        Raises:
+            RedditError: if data is not a reddit listing
+        """
+        try:
+            return Listing.from_json(data)
+        except (ValueError, TypeError, AttributeError) as err:
+            raise RedditError(None, f"Invalid listing: {err}", url) from err
 
     @staticmethod
     def _check_argument(value, expected_value):
@@ -48,22 +163,21 @@ class Reddit:
                     f"Expected one of {expected_value!r}, got {type(value).__name__}"
                 )
 
-    def is_subreddit_has_posts(self, subreddit):
-        """Check if subreddit has posts
+    @staticmethod
+    def has_posts(listing):
+        """Check if listing has posts
 
         Args:
-            subreddit (str): Subreddit
+            listing (reddit.models.Listing): Subreddit posts
 
         Returns:
-            bool: True if subreddit has posts
+            bool: True if listing has posts
         """
-        url = f"{self._BASE_URL}{subreddit}/top.json"
-        data = self.get_json(url, {"t": "day", "limit": 1})
-        if data.get("data", {}).get("children"):
-            return True
-        return False
+        return len(listing) > 0
 
-    def get_subreddit_top_posts(self, subreddit, sort="top", t="day", limit=5):
+    def get_subreddit_top_posts(
+        self, subreddit, sort="top", t="day", limit=5, priority=PRIORITY_HIGH
+    ):
         """Get subreddit posts
 
         Args:
@@ -71,15 +185,71 @@ class Reddit:
             sort (str): Sort key (one of "relevance", "hot", "top", "new", "comments")
             t (str): Search period (one of "hour", "day", "week", "month", "year", "all")
             limit (int): Posts limit (1 - 100)
+            priority (int): Request priority for rate limiter
 
         Returns:
-            Dict: Response data
+            reddit.models.Listing: Subreddit posts, empty if subreddit not found
+
+        Raises:
+            RedditError: if reddit is not available
         """
         self._check_argument(sort, limits.sort)
         self._check_argument(t, limits.t)
         self._check_argument(limit, limits.limit)
 
         url = f"{self._BASE_URL}{subreddit}/top.json"
-        params = {"sort": sort, "t": t, "limit": limit}
+        # Titles and urls are not html escaped with raw_json
+        params = {"sort": sort, "t": t, "limit": limit, "raw_json": 1}
+
+        def load():
+            try:
+                return self.parse_listing(self.get_json(url, params, priority), url)
+            except RedditError as err:
+                if err.status_code in self._NOT_FOUND_STATUSES:
+                    logger.info(f"Subreddit {subreddit} not available: {err}")
+                    return Listing()
+                raise
+
+        if self.cache is None:
+            return load()
+
+        return self.cache.get_or_load(
+            self.cache.make_key(subreddit, sort, t, limit),
+            load,
+            is_negative=lambda listing: not self.has_posts(listing),
+        )
+
+    def get_many_top_posts(
+        self, subreddits, sort="top", t="day", limit=5, priority=PRIORITY_HIGH
+    ):
+        """Get posts of many subreddits concurrently
+
+        Args:
+            subreddits (Iterable[str]): Subreddits
+            sort (str): Sort key (one of "relevance", "hot", "top", "new", "comments")
+            t (str): Search period (one of "hour", "day", "week", "month", "year", "all")
+            limit (int): Posts limit (1 - 100)
+            priority (int): Request priority for rate limiter
 
-        return self.get_json(url, params)
+        Yields:
+            Tuple[str, reddit.models.Listing | None]: Subreddit and posts in
+                completion order, posts are None if request failed
+        """
+        futures = {
+            self._executor.submit(
+                self.get_subreddit_top_posts, subreddit, sort, t, limit, priority
+            ): subreddit
+            for subreddit in dict.fromkeys(subreddits)
+        }
+        try:
+            for future in as_completed(futures):
+                subreddit = futures[future]
+                try:
+                    data = future.result()
+                except RedditError:
+                    logger.exception(f"Failed to get posts for subreddit {subreddit}")
+                    data = None
+                yield subreddit, data
+        finally:
+            for future in futures:
+                future.cancel()
@@ -1,48 +1,331 @@
+import time
 import logging
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 
-from db import get_cur_subreddits
-from bot.handlers.utils import build_message, get_subreddit_link
+from db import (
+    get_news_plan,
+    get_users_names,
+    claim_due_users,
+    release_users,
+    get_unscheduled_users,
+    set_next_deliveries,
+    get_next_delivery,
+)
+from timezones import next_local_time, DAILY
+from reddit import PRIORITY_LOW
+from bot.handlers.utils import format_counts
 
 logger = logging.getLogger(__name__)
 
+# Missed news older than this are skipped, e.g. after downtime
+MAX_DELIVERY_DELAY = timedelta(hours=1)
+# Delay before next news job after failed one
+FAILED_NEWS_RETRY = timedelta(minutes=1)
+
+NEWS_MESSAGE_OPTIONS = {"parse_mode": "HTML", "disable_web_page_preview": True}
+
+
+def get_next_delivery_time(context, user, after):
+    """Get user next news delivery time
+
+    Args:
+        context (telegram.ext.CallbackContext): Telegram bot context
+        user (Tuple): User `db.SCHEDULE_COLUMNS`
+        after (datetime.datetime): Utc time, result is later than it
+
+    Returns:
+        datetime.datetime: Utc time
+    """
+    if user.news_time_min is None:
+        news_time = context.bot.news_time
+    else:
+        news_time = user.news_time_min
+    return next_local_time(
+        news_time,
+        after,
+        user.timezone,
+        user.utc_offset_min,
+        user.news_cadence or DAILY,
+        user.news_weekday,
+    )
+
+
+def schedule_users(context, now):
+    """Set next delivery time of new users and users with changed timezone
+
+    Args:
+        context (telegram.ext.CallbackContext): Telegram bot context
+        now (datetime.datetime): Current utc time
+    """
+    while True:
+        users = get_unscheduled_users()
+        if not users:
+            return
+        set_next_deliveries(
+            {user.id: get_next_delivery_time(context, user, now) for user in users}
+        )
+        logger.info(f"Scheduled news for {len(users)} users")
+
 
 def send_news(context):
     """Send news to subscribers
 
+    Users with due next delivery time are claimed in batches of
+    `context.bot.delivery_batch`, so processes sharing database
+    deliver disjoint users. Leases of failed batch are released,
+    so its users are retried by the next news job.
+
     Args:
         context (telegram.ext.CallbackContext): Telegram bot context
     """
-    time_now = datetime.utcnow().replace(second=0, microsecond=0).time()
-    offset = context.bot.news_time - (time_now.hour * 60 + time_now.minute)
-    logger.info(f"Send news for users with offset: {offset}")
-    for subreddit in get_cur_subreddits():
-        data = context.bot.reddit.get_subreddit_top_posts(subreddit.title, limit=5)
-        for user in subreddit.users:
-            logger.debug(f'User {user} offset: {user.utc_offset_min}')
-            if user.utc_offset_min == offset:
-                message = f"Subreddit: {get_subreddit_link(subreddit.title)}\n"
-                message += build_message(data)
+    now = datetime.utcnow()
+    schedule_users(context, now)
+    batch_size = context.bot.delivery_batch
+    while True:
+        due_users = claim_due_users(
+            now, context.bot.worker_id, context.bot.lease_seconds, batch_size
+        )
+        if not due_users:
+            logger.debug(f"No users with news due at {now}")
+            return
+        try:
+            _send_news_batch(context, due_users, now)
+        except Exception:
+            release_users((user.id for user in due_users), context.bot.worker_id)
+            raise
+        if len(due_users) < batch_size:
+            return
 
-                context.bot.send_message(
-                    user.id,
-                    message.format(user=user),
-                    parse_mode="HTML",
-                    disable_web_page_preview=True,
-                )
+
+def _send_news_batch(context, due_users, now):
+    """Send news to claimed users
+
+    Claimed users get news, then their next delivery time is moved
+    to the next period. In digest mode (`context.bot.news_digest`)
+    all user subreddits are packed into as few messages as possible.
+
+    Args:
+        context (telegram.ext.CallbackContext): Telegram bot context
+        due_users (List[Tuple]): Claimed users `db.SCHEDULE_COLUMNS`
+        now (datetime.datetime): Current utc time
+    """
+    news_plan = get_news_plan(
+        now, since=now - MAX_DELIVERY_DELAY, lease_owner=context.bot.worker_id
+    )
+    logger.info(f"Send news for {len(due_users)} users: {len(news_plan)} subreddits")
+    # Keys of scheduled time do not duplicate news if tick is repeated
+    key_prefixes = {
+        user.id: f"news:{user.next_delivery_utc:%Y%m%d%H%M}" for user in due_users
+    }
+    renderer = context.bot.renderer
+    users = {}
+    if renderer.is_personal:
+        users = get_users_names(
+            {chat_id for chat_ids in news_plan.values() for chat_id in chat_ids}
+        )
+
+    rendered = {}
+    posts = context.bot.reddit.get_many_top_posts(news_plan, limit=5)
+    for subreddit_title, data in posts:
+        if data is None:
+            continue
+        rendered[subreddit_title] = renderer.render_posts(subreddit_title, data)
+        if not rendered[subreddit_title]:
+            logger.info(f"No posts found for subreddit {subreddit_title}")
+
+    user_subreddits = {}
+    for subreddit_title, chat_ids in news_plan.items():
+        for chat_id in chat_ids:
+            if chat_id in key_prefixes:
+                user_subreddits.setdefault(chat_id, []).append(subreddit_title)
+
+    news = (
+        (key_prefixes[chat_id], chat_id, users.get(chat_id), subreddits)
+        for chat_id, subreddits in user_subreddits.items()
+    )
+    messages = [
+        (key, chat_id, text, NEWS_MESSAGE_OPTIONS)
+        for key, chat_id, text in renderer.render_news(
+            news, rendered, context.bot.news_digest
+        )
+    ]
+    saved = context.bot.send_durable(messages)
+    logger.info(f"Saved {saved} news messages to outbox")
+    set_next_deliveries(
+        {user.id: get_next_delivery_time(context, user, now) for user in due_users}
+    )
+
+
+class NewsScheduler:
+    """Run news job when the earliest delivery is due
+
+    Users next delivery times are kept in indexed database column,
+    so the earliest one is found without scanning users. Job queue
+    sleeps until it instead of waking every minute, prefetch runs
+    `bot.prefetch_minutes` before it.
+
+    Args:
+        job_queue (telegram.ext.JobQueue): Bot job queue
+        max_sleep (int | float): Max seconds between news jobs, picks up
+            schedule changes made outside of bot
+    """
+
+    def __init__(self, job_queue, max_sleep=3600):
+        self.job_queue = job_queue
+        self.max_sleep = max_sleep
+        self._job = None
+        self._run_at = None
+        self._prefetch_at = None
+        self._lock = threading.Lock()
+
+    def wake(self, when=None):
+        """Run news job at time if it is earlier than planned
+
+        Should be called after users schedule changes.
+
+        Args:
+            when (datetime.datetime): Utc time, default now
+        """
+        now = datetime.utcnow()
+        when = when or now
+        with self._lock:
+            # Job without next time has already run or failed
+            if (
+                self._run_at is not None
+                and self._run_at <= when
+                and self._job.next_t is not None
+            ):
+                return
+            if self._job is not None:
+                self._job.schedule_removal()
+            self._run_at = when
+            self._job = self.job_queue.run_once(
+                self._run, max((when - now).total_seconds(), 0)
+            )
+        logger.debug(f"News job planned at {when}")
+
+    def _run(self, context):
+        with self._lock:
+            self._job = self._run_at = None
+        failed = True
+        try:
+            send_news(context)
+            failed = False
+        finally:
+            now = datetime.utcnow()
+            next_delivery = get_next_delivery()
+            when = now + timedelta(seconds=self.max_sleep)
+            if next_delivery is not None:
+                when = min(when, next_delivery)
+                self._plan_prefetch(context, next_delivery, now)
+            if failed:
+                # Released users are due at once, do not retry in busy loop
+                when = max(when, now + FAILED_NEWS_RETRY)
+            self.wake(when)
+
+    def _plan_prefetch(self, context, next_delivery, now):
+        if context.bot.prefetch_minutes <= 0:
+            return
+        prefetch_at = next_delivery - timedelta(minutes=context.bot.prefetch_minutes)
+        if prefetch_at > now and prefetch_at != self._prefetch_at:
+            self._prefetch_at = prefetch_at
+            self.job_queue.run_once(prefetch_news, (prefetch_at - now).total_seconds())
+
+
+def drain_outbox(context):
+    """Queue not delivered messages from outbox
+
+    Resumes news delivery after restart and retries failed messages.
+
+    Args:
+        context (telegram.ext.CallbackContext): Telegram bot context
+    """
+    context.bot.drain_outbox()
+
+
+def cleanup_outbox(context):
+    """Delete delivered outbox messages older than a day
+
+    Args:
+        context (telegram.ext.CallbackContext): Telegram bot context
+    """
+    deleted = context.bot.db.outbox_cleanup(datetime.utcnow() - timedelta(days=1))
+    logger.info(f"Deleted {deleted} delivered outbox messages")
+
+
+def prefetch_news(context):
+    """Warm up reddit listings cache for upcoming news
+
+    Fetches posts of subreddits needed by users who get news
+    in `context.bot.prefetch_minutes` minutes, so send_news takes
+    them from cache.
+
+    Args:
+        context (telegram.ext.CallbackContext): Telegram bot context
+    """
+    now = datetime.utcnow()
+    news_plan = get_news_plan(
+        now + timedelta(minutes=context.bot.prefetch_minutes), since=now
+    )
+    if news_plan:
+        # Do not block job queue thread while fetching
+        context.dispatcher.run_async(_prefetch_subreddits, context, news_plan)
+
+
+def _prefetch_subreddits(context, subreddits):
+    """Fetch subreddits posts into cache
+
+    Args:
+        context (telegram.ext.CallbackContext): Telegram bot context
+        subreddits (Iterable[str]): Subreddits to fetch
+    """
+    started = time.monotonic()
+    posts = context.bot.reddit.get_many_top_posts(
+        subreddits, limit=5, priority=PRIORITY_LOW
+    )
+    warmed = failed = 0
+    for _, data in posts:
+        if data is None:
+            failed += 1
+        else:
+            warmed += 1
+
+    logger.info(
+        f"Prefetched {warmed} listings "
+        f"in {time.monotonic() - started:.2f}s, failed: {failed}, "
+        f"cache: {context.bot.reddit.cache}"
+    )
 
 
 def backup_db(context):
     """Send backup to admin user
 
+    Full backup is sent every `bot.backup_full_days`, changes since
+    previous backup are sent between them.
+
     Args:
         context (telegram.ext.CallbackContext): Telegram bot context
     """
     logger.info("Run backup database")
     if context.bot.admin:
-        with context.bot.db.create_dump() as dump_file:
-            caption = "\n".join(
-                f"<b>{tablename}</b>: {len(data)} rows"
-                for tablename, data in dump_file.data.items()
+        since = context.bot.db.get_backup_since(
+            timedelta(days=context.bot.backup_full_days)
+        )
+        with context.bot.db.create_dump(since=since) as dump_file:
+            if since is None:
+                caption = f"Full backup\n{format_counts(dump_file.counts)}"
+            else:
+                caption = (
+                    f"Changes since {since:%Y-%m-%d %H:%M:%S} UTC\n"
+                    f"{format_counts(dump_file.counts)}\n"
+                    f"<b>Deleted</b>:\n{format_counts(dump_file.deleted)}"
+                )
+            context.bot.send_document(
+                context.bot.admin,
+                dump_file,
+                filename=dump_file.file_name,
+                caption=caption,
+                parse_mode='HTML',
             )
-            context.bot.send_document(context.bot.admin, dump_file, caption=caption, parse_mode='HTML')
+            context.bot.db.backup_done(dump_file)
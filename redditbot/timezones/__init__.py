@@ -0,0 +1,4 @@
+from .resolver import TimeZoneResolver, TimeZoneError, utc_offset
+from .offline import OfflineTimeZoneFinder
+from .local import get_tzinfo, next_local_time, HOURLY, DAILY, WEEKLY, CADENCES
+from . import geohash
@@ -0,0 +1,41 @@
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def encode(latitude, longitude, precision=5):
+    """Encode location to geohash
+
+    Nearby locations share geohash prefix, precision 5 is a cell
+    about 4.9 x 4.9 km.
+
+    For more information: https://en.wikipedia.org/wiki/Geohash
+
+    Args:
+        latitude (int | float): Latitude
+        longitude (int | float): Longitude
+        precision (int): Geohash length
+
+    Returns:
+        str: Geohash
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit = 0
+    even = True
+    while len(geohash) < precision:
+        value, value_range = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        if value >= middle:
+            bits = bits * 2 + 1
+            value_range[0] = middle
+        else:
+            bits = bits * 2
+            value_range[1] = middle
+        even = not even
+
+        bit += 1
+        if bit == 5:
+            geohash.append(_BASE32[bits])
+            bits = bit = 0
+    return "".join(geohash)
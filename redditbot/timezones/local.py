@@ -0,0 +1,70 @@
+from datetime import timedelta, timezone
+
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+HOURLY = "hourly"
+DAILY = "daily"
+WEEKLY = "weekly"
+CADENCES = (HOURLY, DAILY, WEEKLY)
+
+
+def get_tzinfo(tz_id=None, utc_offset_min=0):
+    """Get user tzinfo
+
+    Args:
+        tz_id (str): IANA timezone id, fixed offset is used if not set or unknown
+        utc_offset_min (int): Fixed utc offset in minutes
+
+    Returns:
+        datetime.tzinfo: Timezone
+    """
+    if tz_id:
+        try:
+            return ZoneInfo(tz_id)
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    return timezone(timedelta(minutes=utc_offset_min or 0))
+
+
+def next_local_time(
+    minutes, after, tz_id=None, utc_offset_min=0, cadence=DAILY, weekday=0
+):
+    """Get next utc time when local time is given time of day
+
+    Local time follows DST shifts of IANA timezone.
+
+    Args:
+        minutes (int): Local time of day in minutes, only minutes of hour
+            are used for hourly cadence
+        after (datetime.datetime): Naive utc time, result is later than it
+        tz_id (str): IANA timezone id
+        utc_offset_min (int): Fixed utc offset in minutes, used without tz_id
+        cadence (str): HOURLY, DAILY or WEEKLY
+        weekday (int): Local day of week for weekly cadence, Monday is 0
+
+    Returns:
+        datetime.datetime: Naive utc time
+    """
+    tz = get_tzinfo(tz_id, utc_offset_min)
+    local_after = after.replace(tzinfo=timezone.utc).astimezone(tz)
+    hour, minute = divmod(minutes, 60)
+    if cadence == HOURLY:
+        local_next = local_after.replace(minute=minute, second=0, microsecond=0)
+        step = timedelta(hours=1)
+    elif cadence == WEEKLY:
+        local_next = local_after.replace(
+            hour=hour, minute=minute, second=0, microsecond=0
+        ) + timedelta(days=((weekday or 0) - local_after.weekday()) % 7)
+        step = timedelta(days=7)
+    else:
+        local_next = local_after.replace(
+            hour=hour, minute=minute, second=0, microsecond=0
+        )
+        step = timedelta(days=1)
+
+    while True:
+        # Wall clock arithmetic, the same local time next period
+        next_utc = local_next.astimezone(timezone.utc).replace(tzinfo=None)
+        if next_utc > after:
+            return next_utc
+        local_next += step
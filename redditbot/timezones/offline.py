@@ -0,0 +1,52 @@
+import logging
+import threading
+
+try:
+    from timezonefinder import TimezoneFinder
+except ImportError:
+    TimezoneFinder = None
+
+logger = logging.getLogger(__name__)
+
+
+class OfflineTimeZoneFinder:
+    """Find timezone by location with bundled timezone boundaries
+
+    Uses optional `timezonefinder` package, boundaries polygons are
+    looked up by its spatial index without network requests.
+
+    Args:
+        in_memory (bool): Load boundaries data to memory for faster lookups
+
+    Raises:
+        RuntimeError: if `timezonefinder` is not installed
+    """
+
+    def __init__(self, in_memory=True):
+        if TimezoneFinder is None:
+            raise RuntimeError("OfflineTimeZoneFinder requires timezonefinder package")
+        self._finder = TimezoneFinder(in_memory=in_memory)
+        # Finder instance is not documented as thread safe
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_available():
+        """Check `timezonefinder` package is installed
+
+        Returns:
+            bool: True if finder can be created
+        """
+        return TimezoneFinder is not None
+
+    def get_timezone_id(self, latitude, longitude):
+        """Get timezone id by latitude and longitude
+
+        Args:
+            latitude (int | float): Latitude
+            longitude (int | float): Longitude
+
+        Returns:
+            str | None: IANA timezone id, None if not found
+        """
+        with self._lock:
+            return self._finder.timezone_at(lat=latitude, lng=longitude)
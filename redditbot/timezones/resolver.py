@@ -0,0 +1,137 @@
+import logging
+from datetime import datetime, timezone
+
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from . import geohash
+
+logger = logging.getLogger(__name__)
+
+
+class TimeZoneError(Exception):
+    """Timezone not resolved"""
+
+
+def utc_offset(tz_id, when=None):
+    """Get timezone UTC offset including DST
+
+    Args:
+        tz_id (str): IANA timezone id
+        when (datetime.datetime): Aware datetime to get offset at, default now
+
+    Returns:
+        int: UTC offset in seconds
+
+    Raises:
+        TimeZoneError: if timezone is unknown
+    """
+    try:
+        tz = ZoneInfo(tz_id)
+    except (ZoneInfoNotFoundError, ValueError) as err:
+        raise TimeZoneError(f"Unknown timezone {tz_id}") from err
+    when = when or datetime.now(timezone.utc)
+    return int(when.astimezone(tz).utcoffset().total_seconds())
+
+
+class TimeZoneResolver:
+    """Resolve timezone by location
+
+    Timezones are cached in database by location geohash, so nearby
+    locations are resolved without lookups. Not cached locations are
+    resolved by offline finder and google api, in preferred order.
+
+    Args:
+        db (module): Database module with geohash timezones cache
+        offline (timezones.OfflineTimeZoneFinder): Offline timezone finder
+        api (googleapi.timezone.TimeZoneAPI): Google timezone api
+        prefer_api (bool): Ask api before offline finder
+        precision (int): Geohash cache key length
+    """
+
+    def __init__(self, db, offline=None, api=None, prefer_api=False, precision=5):
+        self.db = db
+        self.precision = precision
+        self._finders = [
+            finder
+            for finder in ((api, offline) if prefer_api else (offline, api))
+            if finder is not None
+        ]
+
+    @property
+    def enabled(self):
+        """bool: True if any timezone finder is configured"""
+        return bool(self._finders)
+
+    def resolve(self, latitude, longitude):
+        """Get timezone id by location
+
+        Args:
+            latitude (int | float): Latitude
+            longitude (int | float): Longitude
+
+        Returns:
+            str: IANA timezone id
+
+        Raises:
+            TimeZoneError: if timezone not resolved
+        """
+        key = geohash.encode(latitude, longitude, self.precision)
+        tz_id = self.db.get_geohash_timezone(key)
+        if tz_id:
+            logger.debug(f"Timezone cache hit {key}: {tz_id}")
+            return tz_id
+
+        errors = []
+        for finder in self._finders:
+            try:
+                tz_id = finder.get_timezone_id(latitude, longitude)
+            except TimeZoneError as err:
+                logger.warning(f"{type(finder).__name__} failed: {err}")
+                errors.append(str(err))
+                continue
+            if tz_id:
+                self.db.set_geohash_timezone(key, tz_id)
+                return tz_id
+
+        raise TimeZoneError("; ".join(errors) or "Timezone not found")
+
+    async def resolve_async(self, latitude, longitude, run_sync):
+        """Get timezone id by location in event loop
+
+        Finders with `get_timezone_id_async` are awaited, database
+        and other finders run by `run_sync`.
+
+        Args:
+            latitude (int | float): Latitude
+            longitude (int | float): Longitude
+            run_sync (Callable): Coroutine function running blocking function,
+                e.g. `bot.aio.AsyncRunner.run_sync`
+
+        Returns:
+            str: IANA timezone id
+
+        Raises:
+            TimeZoneError: if timezone not resolved
+        """
+        key = geohash.encode(latitude, longitude, self.precision)
+        tz_id = await run_sync(self.db.get_geohash_timezone, key)
+        if tz_id:
+            logger.debug(f"Timezone cache hit {key}: {tz_id}")
+            return tz_id
+
+        errors = []
+        for finder in self._finders:
+            try:
+                if hasattr(finder, "get_timezone_id_async"):
+                    tz_id = await finder.get_timezone_id_async(latitude, longitude)
+                else:
+                    tz_id = await run_sync(finder.get_timezone_id, latitude, longitude)
+            except TimeZoneError as err:
+                logger.warning(f"{type(finder).__name__} failed: {err}")
+                errors.append(str(err))
+                continue
+            if tz_id:
+                await run_sync(self.db.set_geohash_timezone, key, tz_id)
+                return tz_id
+
+        raise TimeZoneError("; ".join(errors) or "Timezone not found")
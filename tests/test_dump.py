@@ -0,0 +1,62 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'db.sqlite')}"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "redditbot"))
+
+import db  # noqa: E402
+from db.base import engine  # noqa: E402
+from db.schema import User, Subreddit, Subscription  # noqa: E402
+
+
+def insert(subreddits, subscriptions):
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"id": 1, "first_name": "A"}])
+        conn.execute(Subreddit.__table__.insert(), subreddits)
+        conn.execute(Subscription.__table__.insert(), subscriptions)
+
+
+def titles():
+    with engine.connect() as conn:
+        return [
+            tuple(row)
+            for row in conn.execute("SELECT id, title FROM subreddits ORDER BY id")
+        ]
+
+
+class RestoreDumpTest(unittest.TestCase):
+    def setUp(self):
+        insert(
+            [{"id": 1, "title": "python"}, {"id": 2, "title": "rust"}],
+            [{"id": 1, "user_id": 1, "subreddit_id": 1}],
+        )
+        with db.create_dump() as dump_file:
+            self.dump = dump_file.read()
+
+    def tearDown(self):
+        with engine.begin() as conn:
+            for table in ("subscriptions", "subreddits", "users", "tombstones"):
+                conn.execute(f"DELETE FROM {table}")
+
+    def test_restore_into_same_rows_updates_them(self):
+        counts = db.restore_dump(io.BytesIO(self.dump))
+        self.assertEqual(counts, {"users": 1, "subreddits": 2, "subscriptions": 1})
+        self.assertEqual(titles(), [(1, "python"), (2, "rust")])
+
+    def test_conflicting_title_is_reported_and_rolled_back(self):
+        self.tearDown()
+        insert(
+            [{"id": 7, "title": "python"}],
+            [{"id": 5, "user_id": 1, "subreddit_id": 7}],
+        )
+        with self.assertRaisesRegex(ValueError, "conflicts with database"):
+            db.restore_dump(io.BytesIO(self.dump))
+        self.assertEqual(titles(), [(7, "python")])
+
+
+if __name__ == "__main__":
+    unittest.main()
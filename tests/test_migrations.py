@@ -0,0 +1,90 @@
+import os
+import sys
+import tempfile
+import unittest
+
+TMP_DIR = tempfile.mkdtemp()
+# Do not touch working database on import
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'import.sqlite')}"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "redditbot"))
+
+import sqlalchemy as sa  # noqa: E402
+
+from db.migrations import upgrade  # noqa: E402
+
+# Tables as created by the first released schema
+BASELINE_SCHEMA = (
+    """CREATE TABLE users (
+        id INTEGER PRIMARY KEY,
+        first_name VARCHAR,
+        last_name VARCHAR,
+        utc_offset_min INTEGER
+    )""",
+    """CREATE TABLE subreddits (
+        id INTEGER PRIMARY KEY,
+        title VARCHAR(255)
+    )""",
+    """CREATE TABLE subscriptions (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER REFERENCES users (id),
+        subreddit_id INTEGER REFERENCES subreddits (id)
+    )""",
+)
+
+
+class UpgradeTest(unittest.TestCase):
+    def setUp(self):
+        path = tempfile.mktemp(suffix=".sqlite", dir=TMP_DIR)
+        self.engine = sa.create_engine(f"sqlite:///{path}")
+        with self.engine.begin() as conn:
+            for statement in BASELINE_SCHEMA:
+                conn.execute(statement)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_duplicate_subreddits_are_merged(self):
+        with self.engine.begin() as conn:
+            conn.execute("INSERT INTO users (id, first_name) VALUES (1, 'A'), (2, 'B')")
+            conn.execute(
+                "INSERT INTO subreddits (id, title) "
+                "VALUES (1, 'python'), (2, 'python'), (3, 'rust')"
+            )
+            conn.execute(
+                "INSERT INTO subscriptions (id, user_id, subreddit_id) "
+                "VALUES (1, 1, 1), (2, 1, 2), (3, 2, 2), (4, 2, 3), (5, 2, 3)"
+            )
+
+        upgrade(self.engine)
+
+        with self.engine.connect() as conn:
+            subreddits = conn.execute(
+                "SELECT id, title FROM subreddits ORDER BY id"
+            ).fetchall()
+            subscriptions = conn.execute(
+                "SELECT user_id, subreddit_id FROM subscriptions ORDER BY id"
+            ).fetchall()
+        self.assertEqual(
+            [tuple(row) for row in subreddits], [(1, "python"), (3, "rust")]
+        )
+        self.assertEqual(
+            [tuple(row) for row in subscriptions], [(1, 1), (2, 1), (2, 3)]
+        )
+
+        indexes = {
+            index["name"]: index["unique"]
+            for index in sa.inspect(self.engine).get_indexes("subscriptions")
+        }
+        self.assertTrue(indexes["ix_subscriptions_user_id_subreddit_id"])
+
+    def test_upgrade_twice_is_noop(self):
+        upgrade(self.engine)
+        upgrade(self.engine)
+        columns = {
+            column["name"] for column in sa.inspect(self.engine).get_columns("users")
+        }
+        self.assertIn("updated_at", columns)
+
+
+if __name__ == "__main__":
+    unittest.main()
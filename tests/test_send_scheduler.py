@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "redditbot"))
+
+from bot.mq_bot import SendScheduler  # noqa: E402
+
+
+class SendSchedulerTest(unittest.TestCase):
+    interval = 0.3
+
+    def setUp(self):
+        self.scheduler = SendScheduler(chat_interval=self.interval, workers=1)
+        self.sent = []
+        self.done = threading.Event()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def send(self, count):
+        self.sent.append(time.monotonic())
+        if len(self.sent) == count:
+            self.done.set()
+
+    def test_trickled_messages_keep_chat_interval(self):
+        count = 4
+        for _ in range(count):
+            self.scheduler.put(42, self.send, count)
+            time.sleep(self.interval / 3)
+
+        self.assertTrue(self.done.wait(self.interval * count * 2))
+        gaps = [later - earlier for earlier, later in zip(self.sent, self.sent[1:])]
+        for gap in gaps:
+            self.assertGreaterEqual(gap, self.interval * 0.95)
+
+    def test_idle_chat_is_forgotten_after_interval(self):
+        self.scheduler.put(42, self.send, 1)
+        self.assertTrue(self.done.wait(1))
+        time.sleep(self.interval * 1.5)
+        # Next message wakes scheduler to drop chats past their interval
+        self.scheduler.put(43, self.send, 2)
+        time.sleep(0.1)
+        with self.scheduler._cond:
+            self.assertNotIn(42, self.scheduler._chats)
+
+
+if __name__ == "__main__":
+    unittest.main()
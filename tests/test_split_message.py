@@ -0,0 +1,32 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "redditbot"))
+
+from bot.handlers.utils import build_message, split_message  # noqa: E402
+from reddit.models import Listing, Post  # noqa: E402
+
+
+class SplitMessageTest(unittest.TestCase):
+    def test_long_title_is_shortened_inside_link(self):
+        listing = Listing([Post("t3_a", "Tom & Jerry " * 500, "https://a.b/c", 7)])
+        message = build_message(listing, max_length=100)
+
+        line = message.rstrip("\n")
+        self.assertLessEqual(len(line), 100)
+        self.assertTrue(line.startswith("<b>7</b> <a href='https://a.b/c'>"))
+        self.assertTrue(line.endswith("…</a>"))
+        self.assertEqual(split_message([message], max_length=100), [line])
+
+    def test_long_line_is_not_cut_inside_tag_or_entity(self):
+        line = "x" * 8 + "&amp;" + "<a href='https://a.b/c'>link</a>"
+        chunks = split_message([line], max_length=12)
+
+        self.assertEqual("".join(chunks), line)
+        self.assertEqual(chunks[:2], ["x" * 8, "&amp;"])
+        self.assertTrue(all(len(chunk) <= 12 for chunk in chunks))
+
+
+if __name__ == "__main__":
+    unittest.main()